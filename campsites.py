@@ -87,7 +87,22 @@ class ReserveCaliforniaCampsite(Campsite):
 
     Subclasses should have the following attributes:
      - facility_id
+
+    Subclasses may also set the following attributes to ask the grid search to
+    only return matching units. Facilities that ignore or reject these filters
+    fall back to client side filtering with site_regex:
+     - unit_type_id
+     - unit_category_id
+     - unit_types_group_ids
     """
+    unit_type_id = 0
+    unit_category_id = 0
+    unit_types_group_ids = ()
+
+    @classmethod
+    def IsNarrowed(cls):
+        """Returns True if the campsite declares any server side unit filters."""
+        return bool(cls.unit_type_id or cls.unit_category_id or cls.unit_types_group_ids)
 
     @classmethod
     def Validate(cls):
@@ -99,6 +114,23 @@ class ReserveCaliforniaCampsite(Campsite):
         return True, None
 
 
+class RecreationGovCampsite(Campsite):
+    """Base class for all Recreation.gov based campsites.
+
+    Subclasses should have the following attributes:
+     - campground_id
+    """
+
+    @classmethod
+    def Validate(cls):
+        is_valid, err_msg = super(RecreationGovCampsite, cls).Validate()
+        if not is_valid:
+            return False, err_msg
+        if not hasattr(cls, 'campground_id'):
+            return False, 'campground_id static attribute not found on campsite class: %s' % cls.__name__
+        return True, None
+
+
 # Campsite class for Steep Ravine cabins.
 class SteepRavine(ReserveCaliforniaCampsite):
     name = 'Steep Ravine'
@@ -9,13 +9,14 @@ from email.mime.text import MIMEText
 
 class EmailSender(object):
 
-    def __init__(self, campsite, admin_email, from_email, from_email_password, to_emails, logger):
+    def __init__(self, campsite, admin_email, from_email, from_email_password, to_emails, logger, timeout_secs=None):
         self.campsite = campsite
         self.admin_email = admin_email
         self.from_email = from_email
         self.from_email_password = from_email_password
         self.to_emails = to_emails
         self.logger = logger
+        self.timeout_secs = timeout_secs  # Optional timeout for smtp connections.
 
     def SendEmail(self, start_date, end_date, site_to_available_dates):
         subject, message = self._MakeSubjectAndMessage(start_date, end_date, site_to_available_dates)
@@ -58,7 +59,10 @@ class EmailSender(object):
         message['To'] = ','.join(to_emails)
 
         self.logger.Log('Creating smtp server')
-        server = smtplib.SMTP('smtp.mailgun.org', 587)
+        if self.timeout_secs:
+            server = smtplib.SMTP('smtp.mailgun.org', 587, timeout=self.timeout_secs)
+        else:
+            server = smtplib.SMTP('smtp.mailgun.org', 587)
         self.logger.Log('\tstarttls')
         server.starttls()
         self.logger.Log('\tehlo')
@@ -1,4 +1,6 @@
 import datetime
+import gc
+import os
 import pytz
 import random
 import time
@@ -9,9 +11,13 @@ import sys
 from campsites import *
 import datetime_util as dt
 import email_sender as es
+import history as hst
 import logger as lgr
-import parser_ra
-import parser_rc
+import notifier
+import parser_registry
+import profiler as prof
+import records
+import status_server
 
 
 USAGE = """
@@ -34,22 +40,51 @@ USAGE = """
             the corresponding campsite.
 
         FLUSH_LOGS = optional, default is true. If set then on each run log will be flushed to a local file.
+
+        HISTORY_DIR = optional environment variable. If set then every poll's availability is appended to a
+            history store in this directory, see history.py.
+
+        PROFILE_DIR, PROFILE_CONTROL_FILE, PROFILE_PASSES = optional environment variables. Sending the process
+            SIGUSR1 or creating PROFILE_CONTROL_FILE (default profile.ctl) profiles the next PROFILE_PASSES
+            (default 1) passes and writes the results to PROFILE_DIR (default profiles), see profiler.py.
+
+        WEBHOOK_URLS = optional environment variable, comma separated list of urls to which availability
+            changes are POSTed as json in addition to being emailed.
+
+        NOTIFY_FILE = optional environment variable. If set then availability changes are also appended
+            as json lines to this file, or written to stdout if it is "-".
+
+        MEMORY_BOUNDED = optional environment variable. If set then only the most recent 10000 log lines are
+            kept in memory and garbage is collected after every pass, for running on small dynos.
+
+        STATUS_PORT = optional environment variable. If set then the latest availability of each campsite is
+            served as json on this port, see status_server.py.
     """
 
 RUN_FREQUENCY_SECS = 60*10  # How often the availability finder should run.
 EMAIL_FREQUENCY_SECS = 60*60*24  # How often we should send availability emails regardless of whether it changes, currently every 24 hours.
+SMTP_TIMEOUT_SECS = 30  # Timeout for each smtp connection made to send an email.
+LOG_BUFFER_MAX_LINES = 10000  # Log lines kept in memory in memory bounded mode.
 
 # TODO: Do something about improving the way we do logging.
 
 class AvailabilityFinder(object):
 
-    def __init__(self, campsite, email_sender, parser, logger):
+    def __init__(self, campsite, email_sender, parser, logger, history=None, profiler=None, dispatcher=None,
+                 status_cache=None):
         self.campsite = campsite
         self.email_sender = email_sender
+        if dispatcher is None:
+            dispatcher = notifier.Dispatcher([notifier.SmtpChannel(email_sender)], logger)
+        self.dispatcher = dispatcher  # Sends availability changes, failures are still emailed to the admin.
         self.parser = parser
         self.logger = logger
-        self.last_result = None  # The last availability result.
+        self.history = history  # Optional history.HistoryStore that every poll is recorded in.
+        self.profiler = profiler  # Optional profiler.Profiler that each phase of a run reports to.
+        self.status_cache = status_cache  # Optional status_server.StatusCache updated after every poll.
+        self.last_result = None  # The last availability result, as a records.Snapshot.
         self.last_email_time = None  # The last time in secs we sent an availability email.
+        self.pending_event = None  # A notifier.ChangeEvent that some channels failed to send.
 
     def _FilterSiteAvailability(self, site_to_available_dates):
         self.logger.Log('Selecting only requested sites from availability...')
@@ -59,20 +94,56 @@ class AvailabilityFinder(object):
                 requested_site_to_availability_dates[site] = dates
         return requested_site_to_availability_dates
 
-    def _ShouldSendEmail(self, site_to_available_dates):
+    def _ShouldSendEmail(self, snapshot):
         """Only send email if the last_result is different from the new result or if it has been
         greater than EMAIL_FREQUENCY_SECS since we last sent an email.."""
-        now = time.time()
-        if self.last_result != site_to_available_dates:
-            self.last_result = dict(site_to_available_dates)
-            self.last_email_time = now
+        if self.last_result != snapshot:
             return True
         # If the availability hasn't changed but it has been more than EMAIL_FREQUENCY_SECS
         # since we sent an email, send it again anyway.
-        if (now - self.last_email_time > EMAIL_FREQUENCY_SECS):
-            self.last_email_time = now
-            return True
-        return False
+        return time.time() - self.last_email_time > EMAIL_FREQUENCY_SECS
+
+    def _Notify(self, start_date, end_date, site_to_available_dates, detected_at):
+        """Sends the availability if it should be, or retries the channels the pending event failed on.
+
+        last_result and last_email_time are only updated once every channel has sent the event,
+        until then the event stays pending and is dispatched again on the next run.
+        """
+        snapshot = records.Snapshot.FromSiteDates(site_to_available_dates)
+        event = notifier.ChangeEvent(self.campsite, start_date, end_date, site_to_available_dates, detected_at)
+        if self.pending_event and self.pending_event.event_id == event.event_id:
+            self.logger.Log('Retrying notifications for %s' % event.event_id)
+            event, resend = self.pending_event, False
+        elif self.pending_event or self._ShouldSendEmail(snapshot):
+            # Availability changed since the pending event, if any, so every channel gets the new one.
+            self.logger.Log('Sending notifications')
+            resend = True
+        else:
+            self.logger.Log('Not sending email.')
+            return
+        self.pending_event = event
+        self.dispatcher.Dispatch(event, resend=resend)
+        self.pending_event = None
+        self.last_result = snapshot
+        self.last_email_time = time.time()
+
+    def _Phase(self, phase):
+        if not self.profiler:
+            return prof.NULL_PHASE
+        return self.profiler.Phase(self.campsite, phase)
+
+    def _RecordHistory(self, start_date, end_date, site_to_available_dates):
+        """Records the poll before notifying, so a notification failure doesn't lose it."""
+        if not self.history:
+            return
+        try:
+            with self._Phase('history'):
+                num_events = self.history.Append(
+                    self.campsite, time.time(), start_date, end_date, site_to_available_dates)
+            self.logger.Log('Recorded poll in history, %s dates opened or closed' % num_events)
+        except Exception:
+            # Losing history shouldn't stop notifications.
+            self.logger.Log('Failed to record poll in history:\n%s' % traceback.format_exc())
 
     def Run(self):
         self.logger.Log('Starting search for %s' % self.campsite.name)
@@ -81,15 +152,18 @@ class AvailabilityFinder(object):
         end_date = today + datetime.timedelta(days=6*30)  # Search up to 6 months.
         try:
             # First find availability of all reservable sites in this campsite.
-            site_to_available_dates = self.parser.ParseAvailability(self.campsite, start_date, end_date)
+            with self._Phase('parser'):
+                site_to_available_dates = self.parser.ParseAvailability(self.campsite, start_date, end_date)
+            detected_at = time.time()
             # Now filter out ones we don't care about.
-            site_to_available_dates = self._FilterSiteAvailability(site_to_available_dates)
+            with self._Phase('filter'):
+                site_to_available_dates = self._FilterSiteAvailability(site_to_available_dates)
             self.logger.Log('Found %s available sites' % len(site_to_available_dates))
-            if self._ShouldSendEmail(site_to_available_dates):
-                self.logger.Log('Sending email')
-                self.email_sender.SendEmail(start_date, end_date, site_to_available_dates)
-            else:
-                self.logger.Log('Not sending email.')
+            if self.status_cache:
+                self.status_cache.Update(self.campsite, site_to_available_dates, detected_at)
+            self._RecordHistory(start_date, end_date, site_to_available_dates)
+            with self._Phase('email'):
+                self._Notify(start_date, end_date, site_to_available_dates, detected_at)
         except BaseException as e:
             self.logger.Log('Encountered exception:\n%s' % traceback.format_exc())
             self.logger.Log('Sending failure email')
@@ -145,17 +219,37 @@ def ConstructAndValidateCampsiteInfo(campsite_info):
     is_valid, err_msg = campsite_class.Validate()
     if not is_valid:
         ErrorExit(err_msg)
+    if not parser_registry.HasBackend(campsite_class):
+        ErrorExit('No parser backend registered for %s', campsite_class_str)
 
     to_emails = [e for e in to_emails_str.split(',') if e]
     return campsite_class, to_emails
 
 
 def GetParser(campsite, logger):
-    if issubclass(campsite, ReserveAmericaCampsite):
-        parser_class = parser_ra.ReserveAmericaParser
-    elif issubclass(campsite, ReserveCaliforniaCampsite):
-        parser_class = parser_rc.ReserveCaliforniaParser
-    return parser_class(logger)
+    # Parser modules are imported lazily by the registry, so only the backends for
+    # the configured campsites are loaded.
+    return parser_registry.GetParser(campsite, logger)
+
+
+def MakeLogger(memory_bounded):
+    # Set flush_to_file to True for debugging.
+    return lgr.Logger(False, LOG_BUFFER_MAX_LINES if memory_bounded else None)
+
+
+def RunPass(finders, logger, memory_bounded, profiler=None):
+    """Runs every finder once, clearing the log buffer after each so a pass doesn't keep the last one's logs."""
+    if profiler:
+        profiler.StartPass()
+    for finder in finders:
+        try:
+            finder.Run()
+        finally:
+            logger.ClearBuffer()
+    if profiler:
+        profiler.EndPass()
+    if memory_bounded:
+        gc.collect()
 
 
 def ErrorExit(msg, args=None):
@@ -173,18 +267,37 @@ def main():
     from_email_password = sys.argv[2]
     admin_email = sys.argv[3]
     finders = []
-    logger = lgr.Logger(False)  # Set this to True for debugging.
+    memory_bounded = bool(os.environ.get('MEMORY_BOUNDED'))
+    logger = MakeLogger(memory_bounded)
+    history_dir = os.environ.get('HISTORY_DIR')
+    history = hst.HistoryStore(history_dir) if history_dir else None
+    profiler = prof.Profiler(
+        os.environ.get('PROFILE_DIR', 'profiles'), logger,
+        control_file=os.environ.get('PROFILE_CONTROL_FILE', 'profile.ctl'),
+        default_passes=int(os.environ.get('PROFILE_PASSES', '1')))
+    profiler.InstallSignalHandler()
+    # Channels other than smtp are shared by all campsites.
+    shared_channels = [notifier.WebhookChannel(url) for url in os.environ.get('WEBHOOK_URLS', '').split(',') if url]
+    if os.environ.get('NOTIFY_FILE'):
+        shared_channels.append(notifier.FileChannel(os.environ['NOTIFY_FILE']))
+    status_cache = None
+    if os.environ.get('STATUS_PORT'):
+        status_cache = status_server.StatusCache()
+        server = status_server.StatusServer(status_cache, int(os.environ['STATUS_PORT']))
+        server.Start()
+        logger.Log('Serving status on port %s' % server.port)
     for campsite_info in sys.argv[4:]:
         campsite, to_emails = ConstructAndValidateCampsiteInfo(campsite_info)
-        email_sender = es.EmailSender(campsite, admin_email, from_email, from_email_password, to_emails, logger)
+        email_sender = es.EmailSender(
+            campsite, admin_email, from_email, from_email_password, to_emails, logger, SMTP_TIMEOUT_SECS)
         parser = GetParser(campsite, logger)
-        availability_finder = AvailabilityFinder(campsite, email_sender, parser, logger)
+        dispatcher = notifier.Dispatcher([notifier.SmtpChannel(email_sender)] + shared_channels, logger)
+        availability_finder = AvailabilityFinder(
+            campsite, email_sender, parser, logger, history, profiler, dispatcher, status_cache)
         finders.append(availability_finder)
 
     while True:
-        for finder in finders:
-            finder.Run()
-            logger.ClearBuffer()
+        RunPass(finders, logger, memory_bounded, profiler)
         PeriodicWait()
         WaitIfQuitePeriod(23, 8, logger)  # quite period is from 1am to 8am.
 
@@ -1,6 +1,94 @@
 import datetime
+import re
+import shutil
+import tempfile
+import campsites
 import find_cabin_availability
+import history
 import logger
+import notifier
+
+
+class MockCampsite(campsites.Campsite):
+    name = 'Mock Campsite'
+    site_regex = re.compile(r'CB.*')
+
+
+class MockParser(object):
+
+    def __init__(self, site_to_available_dates):
+        self.site_to_available_dates = site_to_available_dates
+
+    def ParseAvailability(self, campsite, start_date, end_date):
+        return dict(self.site_to_available_dates)
+
+
+class MockEmailSender(object):
+
+    def __init__(self):
+        self.failures = []
+
+    def SendFailureEmail(self, start_date, end_date, error):
+        self.failures.append(error)
+
+
+class MockChannel(notifier.Channel):
+
+    def __init__(self, name, failures=0):
+        super(MockChannel, self).__init__(name, timeout_secs=1, retries=0, retry_delay_secs=0)
+        self.failures = failures
+        self.sent = []
+
+    def Send(self, event):
+        if self.failures:
+            self.failures -= 1
+            raise IOError('mock failure')
+        self.sent.append(event.event_id)
+
+
+def MakeFinder(channels, history_store=None):
+    tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+    parser = MockParser({'CB1': [tomorrow], 'CP1': [tomorrow]})
+    lgr = logger.Logger(False, echo=False)
+    dispatcher = notifier.Dispatcher(channels, lgr)
+    return find_cabin_availability.AvailabilityFinder(
+        MockCampsite, MockEmailSender(), parser, lgr, history_store, dispatcher=dispatcher)
+
+
+class TestAvailabilityFinder(object):
+
+    def testRun_RecordsHistoryWhenNotifyingFails(self):
+        store = history.HistoryStore(tempfile.mkdtemp())
+        finder = MakeFinder([MockChannel('broken', failures=1)], store)
+        finder.Run()
+        assert len(finder.email_sender.failures) == 1
+        assert list(store.GetSnapshot(MockCampsite, 2**62)) == ['CB1']
+        shutil.rmtree(store.root_dir)
+
+    def testRun_RetriesFailedChannelOnNextRun(self):
+        good = MockChannel('good')
+        flaky = MockChannel('flaky', failures=1)
+        finder = MakeFinder([good, flaky])
+        finder.Run()
+        assert len(finder.email_sender.failures) == 1
+        event_id = finder.pending_event.event_id
+        assert good.sent == [event_id]
+        assert flaky.sent == []
+        assert finder.last_result is None
+
+        # The next run only resends through the channel that failed.
+        finder.Run()
+        assert good.sent == [event_id]
+        assert flaky.sent == [event_id]
+        assert finder.pending_event is None
+        assert finder.last_result is not None
+
+        # Once every channel has sent it unchanged availability isn't sent again.
+        finder.Run()
+        assert good.sent == [event_id]
+        assert flaky.sent == [event_id]
+        assert len(finder.email_sender.failures) == 1
+
 
 class TestQuitePeriod(object):
 
@@ -102,6 +190,8 @@ class TestQuitePeriod(object):
 
 
 if __name__ == "__main__":
+    TestAvailabilityFinder().testRun_RecordsHistoryWhenNotifyingFails()
+    TestAvailabilityFinder().testRun_RetriesFailedChannelOnNextRun()
     TestQuitePeriod().testWaitIfQuitePeriod_QuitePeriodSpansSameDay()
     TestQuitePeriod().testWaitIfQuitePeriod_QuitePeriodSpan2Days()
 
@@ -0,0 +1,400 @@
+"""Append only columnar history of availability snapshots and the changes between them.
+
+Each campsite gets its own directory under the history root holding one file per column:
+
+    poll_time.bin   int64   Time of every poll, in epoch secs.
+    poll_start.bin  int32   First day the poll searched.
+    poll_end.bin    int32   Day after the last day the poll searched.
+    snap_time.bin   int64   One row per (poll, site) with any availability.
+    snap_site.bin   uint16  Site slot, the line number of the site in sites.txt.
+    snap_day.bin    int32   First day (days since epoch) covered by the row's bitmap, the poll's start.
+    snap_bits.bin   bytes   HORIZON_DAYS bit bitmap, bit i is set if first day + i is available.
+    event_time.bin  int64   One row per date that opened or closed between consecutive polls.
+    event_site.bin  uint16
+    event_day.bin   int32
+    event_kind.bin  uint8   OPENED or CLOSED.
+
+Only days inside both polls' search windows are diffed, so dates that roll into or out of the
+window as days pass aren't recorded as opening or closing.
+
+Rows are only ever appended and times only increase, so queries over a time range binary
+search the memory mapped time column and only touch the rows inside the range.
+
+A poll's poll_time row is written last and marks the poll as committed. On load snapshot and
+event rows newer than the last committed poll, left behind by an interrupted append, are dropped.
+"""
+import array
+import bisect
+import collections
+import datetime
+import mmap
+import os
+import pytz
+import statistics
+import sys
+
+HORIZON_DAYS = 192  # Enough for the 6 month search window.
+BITMAP_BYTES = HORIZON_DAYS // 8
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+OPENED = 1
+CLOSED = 2
+
+DEFAULT_TZ = pytz.timezone('US/Pacific')  # Queries bucket times in this timezone by default.
+
+
+def DateToDay(date):
+    """Returns date (a date or datetime) as days since epoch."""
+    return date.toordinal() - EPOCH_ORDINAL
+
+
+def DayToDate(day):
+    return datetime.date.fromordinal(day + EPOCH_ORDINAL)
+
+
+class _Column(object):
+    """A memory mapped, append only file of fixed width values."""
+
+    def __init__(self, path, typecode, width=1):
+        self.path = path
+        self.typecode = typecode
+        self.width = width  # Values per row.
+        self.row_bytes = array.array(typecode).itemsize * width
+        self._mapped_size = 0
+        self._view = None
+
+    def NumRows(self):
+        if not os.path.exists(self.path):
+            return 0
+        return os.path.getsize(self.path) // self.row_bytes
+
+    def Truncate(self, num_rows):
+        with open(self.path, 'ab') as f:
+            f.truncate(num_rows * self.row_bytes)
+        self._view = None
+
+    def Append(self, values):
+        with open(self.path, 'ab') as f:
+            array.array(self.typecode, values).tofile(f)
+
+    def View(self):
+        """Returns a read only memoryview over the whole column, remapping it if it has grown."""
+        size = self.NumRows() * self.row_bytes
+        if size == 0:
+            return memoryview(array.array(self.typecode))
+        if self._view is None or size != self._mapped_size:
+            with open(self.path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            self._view = memoryview(mapped).cast(self.typecode)
+            self._mapped_size = size
+        return self._view
+
+
+class _CampsiteHistory(object):
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.poll_time = self._Column('poll_time', 'q')
+        self.poll_start = self._Column('poll_start', 'i')
+        self.poll_end = self._Column('poll_end', 'i')
+        self.snap_time = self._Column('snap_time', 'q')
+        self.snap_site = self._Column('snap_site', 'H')
+        self.snap_day = self._Column('snap_day', 'i')
+        self.snap_bits = self._Column('snap_bits', 'B', BITMAP_BYTES)
+        self.event_time = self._Column('event_time', 'q')
+        self.event_site = self._Column('event_site', 'H')
+        self.event_day = self._Column('event_day', 'i')
+        self.event_kind = self._Column('event_kind', 'B')
+        # A crash can leave the columns of a table with different lengths, drop partial rows, and
+        # leave rows of a poll that was never committed, drop those too.
+        self._TruncateToShortest([self.poll_time, self.poll_start, self.poll_end])
+        polls = self.poll_time.View()
+        last_poll = polls[-1] if len(polls) else None
+        for table in ([self.snap_time, self.snap_site, self.snap_day, self.snap_bits],
+                      [self.event_time, self.event_site, self.event_day, self.event_kind]):
+            self._TruncateToShortest(table)
+            self._TruncateUncommitted(table, last_poll)
+        self.sites = self._LoadSites()
+        self.site_slots = dict((site, slot) for slot, site in enumerate(self.sites))
+        self.last_bitmaps = self._LoadLastBitmaps()  # Site slot -> (first day, bitmap int).
+        self.last_window = self._LoadLastWindow()  # (start day, end day) searched by the last poll.
+
+    def _Column(self, name, typecode, width=1):
+        return _Column(os.path.join(self.directory, name + '.bin'), typecode, width)
+
+    def _TruncateToShortest(self, columns):
+        num_rows = min(column.NumRows() for column in columns)
+        for column in columns:
+            if column.NumRows() != num_rows:
+                column.Truncate(num_rows)
+
+    def _TruncateUncommitted(self, columns, last_poll):
+        """Drops the rows of columns, whose first column is the time, that are newer than last_poll."""
+        times = columns[0].View()
+        num_rows = 0 if last_poll is None else bisect.bisect_right(times, last_poll)
+        if num_rows < len(times):
+            for column in columns:
+                column.Truncate(num_rows)
+
+    def _LoadSites(self):
+        path = os.path.join(self.directory, 'sites.txt')
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return [line.rstrip('\n') for line in f]
+
+    def _LoadLastBitmaps(self):
+        last_bitmaps = {}
+        polls = self.poll_time.View()
+        if not len(polls):
+            return None
+        last_poll = polls[-1]
+        times = self.snap_time.View()
+        row = bisect.bisect_left(times, last_poll)
+        days = self.snap_day.View()
+        sites = self.snap_site.View()
+        bits = self.snap_bits.View()
+        for i in range(row, len(times)):
+            bitmap = int.from_bytes(bits[i * BITMAP_BYTES:(i + 1) * BITMAP_BYTES], 'little')
+            last_bitmaps[sites[i]] = (days[i], bitmap)
+        return last_bitmaps
+
+    def _LoadLastWindow(self):
+        starts = self.poll_start.View()
+        if not len(starts):
+            return None
+        return starts[-1], self.poll_end.View()[-1]
+
+    def GetSiteSlot(self, site):
+        slot = self.site_slots.get(site)
+        if slot is None:
+            slot = len(self.sites)
+            with open(os.path.join(self.directory, 'sites.txt'), 'a') as f:
+                f.write(site + '\n')
+            self.sites.append(site)
+            self.site_slots[site] = slot
+        return slot
+
+
+def _MakeBitmap(first_day, num_days, dates):
+    bitmap = 0
+    for date in dates:
+        offset = DateToDay(date) - first_day
+        if 0 <= offset < num_days:
+            bitmap |= 1 << offset
+    return bitmap
+
+
+class _UtcOffsets(object):
+    """Caches a timezone's utc offset in secs per quarter hour of epoch time.
+
+    Offsets, and the times they change at, are whole quarter hours, and events come in bursts
+    from the same poll so most lookups hit the cache.
+    """
+
+    def __init__(self, tz):
+        self.tz = tz
+        self.offsets = {}  # Epoch quarter hour -> utc offset secs.
+
+    def Get(self, epoch_secs):
+        quarter_hour = epoch_secs // 900
+        offset = self.offsets.get(quarter_hour)
+        if offset is None:
+            local_time = datetime.datetime.fromtimestamp(epoch_secs, self.tz)
+            offset = self.offsets[quarter_hour] = int(local_time.utcoffset().total_seconds())
+        return offset
+
+
+def _Bits(bitmap):
+    offset = 0
+    while bitmap:
+        if bitmap & 1:
+            yield offset
+        bitmap >>= 1
+        offset += 1
+
+
+class HistoryStore(object):
+    """Stores every poll's availability per campsite under root_dir and answers queries about it."""
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self._histories = {}
+
+    def _GetHistory(self, campsite):
+        history = self._histories.get(campsite.__name__)
+        if history is None:
+            history = _CampsiteHistory(os.path.join(self.root_dir, campsite.__name__))
+            self._histories[campsite.__name__] = history
+        return history
+
+    def Append(self, campsite, poll_time, start_date, end_date, site_to_available_dates):
+        """Records a poll of [start_date, end_date) and the dates that opened or closed since the previous poll.
+
+        Dates outside the searched window, or more than HORIZON_DAYS after start_date, are dropped.
+        """
+        history = self._GetHistory(campsite)
+        poll_time = int(poll_time)
+        first_day = DateToDay(start_date)
+        end_day = min(DateToDay(end_date), first_day + HORIZON_DAYS)
+
+        bitmaps = {}
+        for site, dates in site_to_available_dates.items():
+            bitmap = _MakeBitmap(first_day, end_day - first_day, dates)
+            if bitmap:
+                bitmaps[history.GetSiteSlot(site)] = bitmap
+
+        events = []
+        if history.last_window is not None:
+            # Only compare days both polls searched, dates that passed or newly entered the
+            # search window aren't cancellations or bookings.
+            last_start_day, last_end_day = history.last_window
+            overlap_start = max(first_day, last_start_day) - first_day
+            overlap_end = min(end_day, last_end_day) - first_day
+            overlap_mask = 0
+            if overlap_start < overlap_end:
+                overlap_mask = ((1 << overlap_end) - 1) & ~((1 << overlap_start) - 1)
+            for slot in sorted(set(bitmaps) | set(history.last_bitmaps)):
+                last_first_day, last_bitmap = history.last_bitmaps.get(slot, (first_day, 0))
+                shift = first_day - last_first_day
+                last_bitmap = last_bitmap >> shift if shift >= 0 else last_bitmap << -shift
+                bitmap = bitmaps.get(slot, 0)
+                for offset in _Bits(bitmap & ~last_bitmap & overlap_mask):
+                    events.append((slot, first_day + offset, OPENED))
+                for offset in _Bits(last_bitmap & ~bitmap & overlap_mask):
+                    events.append((slot, first_day + offset, CLOSED))
+
+        slots = sorted(bitmaps)
+        history.snap_bits.Append(b''.join(bitmaps[slot].to_bytes(BITMAP_BYTES, 'little') for slot in slots))
+        history.snap_day.Append([first_day] * len(slots))
+        history.snap_site.Append(slots)
+        history.snap_time.Append([poll_time] * len(slots))
+        history.event_kind.Append([kind for _, _, kind in events])
+        history.event_day.Append([day for _, day, _ in events])
+        history.event_site.Append([slot for slot, _, _ in events])
+        history.event_time.Append([poll_time] * len(events))
+        history.poll_end.Append([end_day])
+        history.poll_start.Append([first_day])
+        history.poll_time.Append([poll_time])
+        history.last_window = (first_day, end_day)
+        history.last_bitmaps = dict((slot, (first_day, bitmaps[slot])) for slot in slots)
+        return len(events)
+
+    def _EventRange(self, history, start_time, end_time):
+        times = history.event_time.View()
+        start = 0 if start_time is None else bisect.bisect_left(times, start_time)
+        end = len(times) if end_time is None else bisect.bisect_left(times, end_time)
+        return times, start, end
+
+    def OpeningEventsByWeekdayHour(self, campsite, start_time=None, end_time=None, tz=DEFAULT_TZ):
+        """Returns a {(weekday, hour): count} dict of dates that opened, in timezone tz.
+
+        weekday is 0 for Monday, as in datetime.weekday().
+        """
+        history = self._GetHistory(campsite)
+        times, start, end = self._EventRange(history, start_time, end_time)
+        kinds = history.event_kind.View()
+        utc_offsets = _UtcOffsets(tz)
+        counts = collections.Counter()
+        for i in range(start, end):
+            if kinds[i] != OPENED:
+                continue
+            local_secs = times[i] + utc_offsets.Get(times[i])
+            # The epoch, day 0, was a Thursday.
+            counts[((local_secs // 86400 + 3) % 7, local_secs % 86400 // 3600)] += 1
+        return dict(counts)
+
+    def OpenDurations(self, campsite, start_time=None, end_time=None):
+        """Returns how many secs each date that opened in the time range stayed open before closing.
+
+        Dates still open at the end of the range aren't included.
+        """
+        history = self._GetHistory(campsite)
+        times, start, end = self._EventRange(history, start_time, end_time)
+        sites = history.event_site.View()
+        days = history.event_day.View()
+        kinds = history.event_kind.View()
+        opened_at = {}
+        durations = []
+        for i in range(start, end):
+            key = (sites[i], days[i])
+            if kinds[i] == OPENED:
+                opened_at[key] = times[i]
+            elif key in opened_at:
+                durations.append(times[i] - opened_at.pop(key))
+        return durations
+
+    def MedianOpenSecs(self, campsite, start_time=None, end_time=None):
+        """Returns the median secs a freed date stays open, or None if no freed date has closed."""
+        durations = self.OpenDurations(campsite, start_time, end_time)
+        if not durations:
+            return None
+        return statistics.median(durations)
+
+    def ChurnPerWindow(self, campsite, window_secs, start_time=None, end_time=None, tz=DEFAULT_TZ):
+        """Returns a list of (window start time, opened count, closed count) for windows with any churn.
+
+        Windows are aligned to local midnight in timezone tz, so daily windows are local days.
+        """
+        history = self._GetHistory(campsite)
+        times, start, end = self._EventRange(history, start_time, end_time)
+        kinds = history.event_kind.View()
+        utc_offsets = _UtcOffsets(tz)
+        windows = collections.OrderedDict()
+        for i in range(start, end):
+            window_start = times[i] - (times[i] + utc_offsets.Get(times[i])) % window_secs
+            counts = windows.get(window_start)
+            if counts is None:
+                counts = windows[window_start] = [0, 0]
+            counts[0 if kinds[i] == OPENED else 1] += 1
+        return [(window_start, opened, closed) for window_start, (opened, closed) in windows.items()]
+
+    def GetSnapshot(self, campsite, poll_time):
+        """Returns the site_to_available_dates dict recorded by the last poll at or before poll_time."""
+        history = self._GetHistory(campsite)
+        polls = history.poll_time.View()
+        index = bisect.bisect_right(polls, int(poll_time)) - 1
+        if index < 0:
+            return None
+        poll_time = polls[index]
+        times = history.snap_time.View()
+        start = bisect.bisect_left(times, poll_time)
+        end = bisect.bisect_right(times, poll_time)
+        sites = history.snap_site.View()
+        days = history.snap_day.View()
+        bits = history.snap_bits.View()
+        site_to_available_dates = {}
+        for i in range(start, end):
+            bitmap = int.from_bytes(bits[i * BITMAP_BYTES:(i + 1) * BITMAP_BYTES], 'little')
+            site_to_available_dates[history.sites[sites[i]]] = [DayToDate(days[i] + offset) for offset in _Bits(bitmap)]
+        return site_to_available_dates
+
+
+USAGE = """
+    Usage:
+        history.py <HISTORY_DIR> <CAMPSITE_CLASS_NAME>
+
+    Prints when dates open up for the campsite and how long they stay open.
+    """
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(USAGE)
+        sys.exit(-1)
+    import campsites
+    campsite = getattr(campsites, sys.argv[2])
+    store = HistoryStore(sys.argv[1])
+    weekdays = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+    counts = store.OpeningEventsByWeekdayHour(campsite)
+    for (weekday, hour), count in sorted(counts.items(), key=lambda item: -item[1]):
+        print('%s %02d:00  %s openings' % (weekdays[weekday], hour, count))
+    median_secs = store.MedianOpenSecs(campsite)
+    if median_secs is not None:
+        print('Median time a freed date stays open: %.1f minutes' % (median_secs / 60.0))
+
+
+if __name__ == '__main__':
+    main()
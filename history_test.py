@@ -0,0 +1,128 @@
+import datetime
+import re
+import shutil
+import tempfile
+import time
+import pytz
+import campsites
+import history
+
+
+class MockCampsite(campsites.Campsite):
+    name = 'Mock Campsite'
+    site_regex = re.compile(r'.*')
+
+
+def LocalTime(day, hour, minute=0):
+    """Returns the epoch secs of a May 2021 time in US/Pacific, whatever the host's timezone."""
+    return history.DEFAULT_TZ.localize(datetime.datetime(2021, 5, day, hour, minute)).timestamp()
+
+
+def SearchWindow(poll_time):
+    """Returns the (start_date, end_date) the finder searches when polling at poll_time."""
+    today = datetime.datetime.fromtimestamp(poll_time, history.DEFAULT_TZ).date()
+    return today + datetime.timedelta(days=1), today + datetime.timedelta(days=6*30)
+
+
+def AppendPoll(store, poll_time, site_to_available_dates):
+    start_date, end_date = SearchWindow(poll_time)
+    return store.Append(MockCampsite, poll_time, start_date, end_date, site_to_available_dates)
+
+
+class TestHistoryStore(object):
+
+    def MakeStore(self):
+        return history.HistoryStore(tempfile.mkdtemp())
+
+    def testAppend_RecordsOpenAndCloseEvents(self):
+        store = self.MakeStore()
+        may = lambda day: datetime.date(2021, 5, day)
+        AppendPoll(store, LocalTime(3, 9), {'CB1': [may(10)]})
+        # Saturday the 8th at 10am two dates open up.
+        AppendPoll(store, LocalTime(8, 10), {'CB1': [may(10), may(20)], 'CB2': [may(21)]})
+        # 30 minutes later one of them is booked.
+        AppendPoll(store, LocalTime(8, 10, 30), {'CB1': [may(10)], 'CB2': [may(21)]})
+        # A day later the other is booked too, and May 10th has passed.
+        AppendPoll(store, LocalTime(11, 10), {})
+
+        assert store.OpeningEventsByWeekdayHour(MockCampsite) == {(5, 10): 2}
+        assert store.OpeningEventsByWeekdayHour(MockCampsite, tz=pytz.utc) == {(5, 17): 2}
+        assert store.OpenDurations(MockCampsite) == [30 * 60, LocalTime(11, 10) - LocalTime(8, 10)]
+        assert store.ChurnPerWindow(MockCampsite, 24 * 60 * 60, start_time=LocalTime(8, 0)) == [
+            (LocalTime(8, 0), 2, 1), (LocalTime(11, 0), 0, 1)]
+        assert store.GetSnapshot(MockCampsite, LocalTime(8, 10, 45)) == {'CB1': [may(10)], 'CB2': [may(21)]}
+        assert store.GetSnapshot(MockCampsite, LocalTime(1, 0)) is None
+        shutil.rmtree(store.root_dir)
+
+    def testAppend_ReopensWhereItLeftOff(self):
+        store = self.MakeStore()
+        may = lambda day: datetime.date(2021, 5, day)
+        AppendPoll(store, LocalTime(3, 9), {'CB1': [may(10)]})
+        store = history.HistoryStore(store.root_dir)
+        # Nothing changed so no events are recorded.
+        assert AppendPoll(store, LocalTime(3, 10), {'CB1': [may(10)]}) == 0
+        assert AppendPoll(store, LocalTime(3, 11), {'CB1': [may(10)], 'CB2': [may(10)]}) == 1
+        shutil.rmtree(store.root_dir)
+
+    def testAppend_DropsInterruptedAppend(self):
+        store = self.MakeStore()
+        may = lambda day: datetime.date(2021, 5, day)
+        AppendPoll(store, LocalTime(3, 9), {'CB1': [may(10)]})
+
+        # The process dies after the snapshot and event rows are written but before the poll is.
+        def Interrupt(values):
+            raise KeyboardInterrupt()
+        store._GetHistory(MockCampsite).poll_end.Append = Interrupt
+        try:
+            AppendPoll(store, LocalTime(3, 10), {'CB2': [may(12)]})
+            assert False, 'Expected KeyboardInterrupt'
+        except KeyboardInterrupt:
+            pass
+
+        store = history.HistoryStore(store.root_dir)
+        assert AppendPoll(store, LocalTime(3, 11), {'CB1': [may(10)]}) == 0
+        assert store.ChurnPerWindow(MockCampsite, 24 * 60 * 60) == []
+        assert store.GetSnapshot(MockCampsite, LocalTime(3, 10)) == {'CB1': [may(10)]}
+        shutil.rmtree(store.root_dir)
+
+    def testAppend_WindowRollsForward(self):
+        store = self.MakeStore()
+        # Every searched date is available and stays available while the window rolls forward a
+        # day at a time, dates leaving and entering the window aren't openings or closings.
+        for day in range(1, 8):
+            poll_time = LocalTime(day, 9)
+            start_date, end_date = SearchWindow(poll_time)
+            dates = [start_date + datetime.timedelta(days=i) for i in range((end_date - start_date).days)]
+            assert AppendPoll(store, poll_time, {'CB1': dates}) == 0
+        # Dates past the end of the window, e.g. from a parser that fetches whole months, are ignored.
+        poll_time = LocalTime(8, 9)
+        start_date, end_date = SearchWindow(poll_time)
+        assert AppendPoll(store, poll_time, {'CB1': dates + [end_date, end_date + datetime.timedelta(days=1)]}) == 0
+        assert max(store.GetSnapshot(MockCampsite, poll_time)['CB1']) < end_date
+        shutil.rmtree(store.root_dir)
+
+    def testQueries_Fast(self):
+        # Roughly 3 months of polls every 10 minutes with a cancellation and a booking every hour.
+        store = self.MakeStore()
+        start_time = LocalTime(1, 0)
+        today = datetime.datetime.fromtimestamp(start_time, history.DEFAULT_TZ).date()
+        for poll in range(13000):
+            day_offset = 1 + (poll // 6) % 150
+            dates = [today + datetime.timedelta(days=day_offset)] if poll % 6 < 3 else []
+            AppendPoll(store, start_time + poll * 600, {'CB1': dates})
+
+        store = history.HistoryStore(store.root_dir)
+        query_start = time.time()
+        assert sum(store.OpeningEventsByWeekdayHour(MockCampsite).values()) > 1000
+        assert store.MedianOpenSecs(MockCampsite) == 30 * 60
+        assert store.ChurnPerWindow(MockCampsite, 24 * 60 * 60)
+        assert time.time() - query_start < 1.0
+        shutil.rmtree(store.root_dir)
+
+
+if __name__ == '__main__':
+    TestHistoryStore().testAppend_RecordsOpenAndCloseEvents()
+    TestHistoryStore().testAppend_ReopensWhereItLeftOff()
+    TestHistoryStore().testAppend_DropsInterruptedAppend()
+    TestHistoryStore().testAppend_WindowRollsForward()
+    TestHistoryStore().testQueries_Fast()
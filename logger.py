@@ -1,14 +1,19 @@
 """Special logging class that maintains a buffer of everything that has been logged."""
+import collections
 
 
 class Logger(object):
 
-    def __init__(self, flush_to_file):
-        self.log_buffer = []
+    def __init__(self, flush_to_file, max_lines=None, echo=True, stream=None):
+        # If max_lines is set only the most recent max_lines messages are kept.
+        self.log_buffer = collections.deque(maxlen=max_lines)
         self.flush_to_file = flush_to_file
+        self.echo = echo  # Whether to print messages, to stream or stdout if stream isn't set.
+        self.stream = stream
 
     def Log(self, message):
-        print(message)
+        if self.echo:
+            print(message, file=self.stream)
         self.log_buffer.append(message)
 
     def GetBuffer(self):
@@ -20,7 +25,7 @@ class Logger(object):
                 for log_line in self.log_buffer:
                     log_file.write(log_line)
                     log_file.write('\n')
-        self.log_buffer = []
+        self.log_buffer.clear()
 
 
 
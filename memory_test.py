@@ -0,0 +1,135 @@
+"""Checks that a long running poller doesn't accumulate memory across passes."""
+import collections
+import datetime
+import re
+import tracemalloc
+import campsites
+import find_cabin_availability
+import notifier
+import parser_ra
+
+CALENDAR_HTML = """
+<html><body><table id="calendar"><tbody>
+  <tr><td>header</td></tr>
+  <tr>
+    <td><div class="siteListLabel"><a>%s</a></div></td>
+    <td class="status"><a>A</a></td><td class="status">R</td><td class="status"><a>A</a></td>
+  </tr>
+</tbody></table></body></html>
+"""
+
+
+class MockCampsite(campsites.ReserveAmericaCampsite):
+    name = 'Mock Campsite'
+    site_regex = re.compile(r'.*')
+    request_url = 'http://localhost/calendar'
+    form_params = {}
+
+
+class MockResponse(object):
+
+    def __init__(self, text):
+        self.status_code = 200
+        self.text = text
+
+
+class MockSession(object):
+    """Stands in for requests.Session, serving a calendar page with a different site each pass."""
+    num_posts = 0
+
+    def get(self, url):
+        pass
+
+    def post(self, url, data=None):
+        MockSession.num_posts += 1
+        return MockResponse(CALENDAR_HTML % ('Site%s' % (MockSession.num_posts % 3)))
+
+    def close(self):
+        pass
+
+
+class MockRequests(object):
+    Session = MockSession
+
+
+class FailingSession(MockSession):
+    """A session whose post fails, recording whether it was closed."""
+    num_closed = 0
+
+    def post(self, url, data=None):
+        raise IOError('simulated failure')
+
+    def close(self):
+        FailingSession.num_closed += 1
+
+
+class FailingRequests(object):
+    Session = FailingSession
+
+
+class SimulatedParser(parser_ra.ReserveAmericaParser):
+    """Parses a single window per pass and fails every 50th pass."""
+
+    def ParseAvailability(self, campsite, start_date, end_date):
+        if MockSession.num_posts % 50 == 49:
+            MockSession.num_posts += 1
+            raise IOError('simulated failure')
+        site_to_available_dates = collections.defaultdict(list)
+        self._GetAvailability(campsite, start_date, site_to_available_dates)
+        return site_to_available_dates
+
+
+class MockEmailSender(object):
+
+    def SendFailureEmail(self, start_date, end_date, error):
+        pass
+
+
+class MockChannel(notifier.Channel):
+
+    def __init__(self):
+        super(MockChannel, self).__init__('mock', timeout_secs=1, retries=0, retry_delay_secs=0)
+
+    def Send(self, event):
+        pass
+
+
+class TestMemoryBounded(object):
+
+    def testRun_MemoryStaysFlat(self):
+        parser_ra.requests = MockRequests()
+        lgr = find_cabin_availability.MakeLogger(memory_bounded=True)
+        dispatcher = notifier.Dispatcher([MockChannel()], lgr)
+        finder = find_cabin_availability.AvailabilityFinder(
+            MockCampsite, MockEmailSender(), SimulatedParser(lgr), lgr, dispatcher=dispatcher)
+
+        def RunPasses(num_passes):
+            for _ in range(num_passes):
+                find_cabin_availability.RunPass([finder], lgr, memory_bounded=True)
+
+        tracemalloc.start()
+        try:
+            # Warm up until every bounded cache is full.
+            RunPasses(200)
+            warm_memory, _ = tracemalloc.get_traced_memory()
+            RunPasses(800)
+            final_memory, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        print('Memory after warm up: %s bytes, after 1000 passes: %s bytes' % (warm_memory, final_memory))
+        assert final_memory - warm_memory < 64 * 1024
+
+    def testGetAvailability_ClosesSessionOnFailure(self):
+        parser_ra.requests = FailingRequests()
+        parser = parser_ra.ReserveAmericaParser(find_cabin_availability.MakeLogger(memory_bounded=True))
+        try:
+            parser._GetAvailability(MockCampsite, datetime.date(2021, 5, 1), collections.defaultdict(list))
+            assert False, 'Expected IOError'
+        except IOError:
+            pass
+        assert FailingSession.num_closed == 1
+
+
+if __name__ == '__main__':
+    TestMemoryBounded().testRun_MemoryStaysFlat()
+    TestMemoryBounded().testGetAvailability_ClosesSessionOnFailure()
@@ -0,0 +1,205 @@
+"""Fans availability change events out to several notification channels in parallel.
+
+Every channel has its own timeout and retries, and a slow or failing channel doesn't hold
+up delivery through the others. The dispatcher remembers which channels an event has been
+delivered to, so dispatching the same event again only sends it to channels that failed,
+and records the latency from when the change was detected to when each channel sent it.
+
+Event ids only depend on the campsite and its availability, so polls that find the same
+availability produce the same id and receivers can use it to drop duplicates.
+"""
+import collections
+import concurrent.futures
+import hashlib
+import json
+import sys
+import threading
+import time
+import requests
+
+
+class Error(Exception):
+    pass
+
+
+# Used for the dispatch deadline of an EmailSender without a timeout, its connections could still hang.
+DEFAULT_SMTP_TIMEOUT_SECS = 60
+
+
+class ChangeEvent(object):
+    """A campsite's availability that should be sent out."""
+
+    def __init__(self, campsite, start_date, end_date, site_to_available_dates, detected_at):
+        self.campsite = campsite
+        self.start_date = start_date
+        self.end_date = end_date
+        self.site_to_available_dates = site_to_available_dates
+        self.detected_at = detected_at  # Time in secs the availability was found.
+        digest = hashlib.sha1(repr((
+            campsite.__name__, sorted(self._FormatSiteDates().items()))).encode())
+        self.event_id = '%s-%s' % (campsite.__name__, digest.hexdigest()[:16])
+
+    def _FormatSiteDates(self):
+        return dict(
+            (site, [date.strftime(r'%Y-%m-%d') for date in sorted(dates)])
+            for site, dates in self.site_to_available_dates.items())
+
+    def ToJson(self):
+        return {
+            'event_id': self.event_id,
+            'campsite': self.campsite.name,
+            'start_date': self.start_date.isoformat(),
+            'end_date': self.end_date.isoformat(),
+            'detected_at': self.detected_at,
+            'site_to_available_dates': self._FormatSiteDates(),
+        }
+
+
+class Channel(object):
+    """Base class for notification channels.
+
+    Subclasses implement Send, which should raise on failure and respect timeout_secs.
+    """
+
+    def __init__(self, name, timeout_secs, retries, retry_delay_secs):
+        self.name = name
+        self.timeout_secs = timeout_secs
+        self.retries = retries  # Attempts after the first one fails.
+        self.retry_delay_secs = retry_delay_secs
+
+    def GetDeadlineSecs(self):
+        """Returns how long sending, including every retry and the delays between them, may take."""
+        retry_delays_secs = self.retry_delay_secs * self.retries * (self.retries + 1) / 2.0
+        return self.timeout_secs * (self.retries + 1) + retry_delays_secs
+
+    def Send(self, event):
+        raise NotImplementedError
+
+
+class SmtpChannel(Channel):
+    """Sends the availability email through an email_sender.EmailSender, using its smtp timeout."""
+
+    def __init__(self, email_sender, retries=2, retry_delay_secs=5):
+        super(SmtpChannel, self).__init__(
+            'smtp', email_sender.timeout_secs or DEFAULT_SMTP_TIMEOUT_SECS, retries, retry_delay_secs)
+        self.email_sender = email_sender
+
+    def Send(self, event):
+        self.email_sender.SendEmail(event.start_date, event.end_date, event.site_to_available_dates)
+
+
+class WebhookChannel(Channel):
+    """POSTs the event as json to url. The X-Event-Id header lets receivers drop retried duplicates."""
+
+    def __init__(self, url, timeout_secs=10, retries=3, retry_delay_secs=1):
+        super(WebhookChannel, self).__init__('webhook:%s' % url, timeout_secs, retries, retry_delay_secs)
+        self.url = url
+
+    def Send(self, event):
+        response = requests.post(
+            self.url, json=event.ToJson(), headers={'X-Event-Id': event.event_id}, timeout=self.timeout_secs)
+        if not 200 <= response.status_code < 300:
+            raise Error('Receive http code %s from %s' % (response.status_code, self.url))
+
+
+class FileChannel(Channel):
+    """Appends the event as a json line to path, or writes it to stdout if path is '-'."""
+
+    def __init__(self, path, timeout_secs=10, retries=0, retry_delay_secs=0):
+        super(FileChannel, self).__init__('file:%s' % path, timeout_secs, retries, retry_delay_secs)
+        self.path = path
+        self.lock = threading.Lock()
+
+    def Send(self, event):
+        line = json.dumps(event.ToJson(), sort_keys=True) + '\n'
+        with self.lock:
+            if self.path == '-':
+                sys.stdout.write(line)
+                sys.stdout.flush()
+            else:
+                with open(self.path, 'a') as f:
+                    f.write(line)
+
+
+class Dispatcher(object):
+
+    def __init__(self, channels, logger, max_remembered_events=100, max_latencies=100):
+        self.channels = channels
+        self.logger = logger
+        self.max_remembered_events = max_remembered_events
+        # event_id -> set of channel names the event was delivered to, oldest first.
+        self.delivered = collections.OrderedDict()
+        # (event_id, channel name, secs from detection to send) for recent deliveries.
+        self.latencies = collections.deque(maxlen=max_latencies)
+        # Channel name -> future of its latest send, which may outlive the dispatch that started it.
+        self.sends = {}
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(len(channels), 1))
+
+    def _SendWithRetries(self, channel, event):
+        attempt = 0
+        while True:
+            try:
+                channel.Send(event)
+                return time.time() - event.detected_at
+            except Exception as e:
+                if attempt >= channel.retries:
+                    raise
+                attempt += 1
+                self.logger.Log('Sending %s through %s failed (%s), retry %s of %s' % (
+                    event.event_id, channel.name, e, attempt, channel.retries))
+                time.sleep(channel.retry_delay_secs * attempt)
+
+    def Dispatch(self, event, resend=False):
+        """Sends event through every channel it hasn't been delivered to yet.
+
+        If resend is set the event is sent through every channel, even ones it was delivered to
+        before, e.g. when availability changes back or for a periodic reminder.
+
+        Each channel gets its GetDeadlineSecs from the start of the dispatch, a channel that hasn't
+        finished by then counts as failed and isn't sent through again until its send returns.
+
+        Returns a {channel name: secs from detection to send} dict for this dispatch. Raises
+        Error once all channels have finished or passed their deadline if any of them failed.
+        """
+        dispatch_start_time = time.time()
+        delivered_to = self.delivered.get(event.event_id)
+        if delivered_to is None or resend:
+            delivered_to = self.delivered[event.event_id] = set()
+            self.delivered.move_to_end(event.event_id)
+            while len(self.delivered) > self.max_remembered_events:
+                self.delivered.popitem(last=False)
+
+        futures = {}
+        latencies = {}
+        failures = []
+        for channel in self.channels:
+            if channel.name in delivered_to:
+                self.logger.Log('Already sent %s through %s, skipping' % (event.event_id, channel.name))
+                continue
+            previous_send = self.sends.get(channel.name)
+            if previous_send is not None and not previous_send.done():
+                self.logger.Log('Still sending through %s, skipping %s' % (channel.name, event.event_id))
+                failures.append('%s: still sending a previous event' % channel.name)
+                continue
+            futures[channel] = self.sends[channel.name] = self.executor.submit(self._SendWithRetries, channel, event)
+
+        for channel, future in futures.items():
+            channel_name = channel.name
+            try:
+                remaining_secs = dispatch_start_time + channel.GetDeadlineSecs() - time.time()
+                latency = future.result(timeout=max(remaining_secs, 0))
+            except concurrent.futures.TimeoutError:
+                self.logger.Log('Timed out sending %s through %s' % (event.event_id, channel_name))
+                failures.append('%s: timed out after %.1f secs' % (channel_name, channel.GetDeadlineSecs()))
+                continue
+            except Exception as e:
+                self.logger.Log('Failed to send %s through %s: %s' % (event.event_id, channel_name, e))
+                failures.append('%s: %s' % (channel_name, e))
+                continue
+            delivered_to.add(channel_name)
+            latencies[channel_name] = latency
+            self.latencies.append((event.event_id, channel_name, latency))
+            self.logger.Log('Sent %s through %s, %.2f secs after detection' % (event.event_id, channel_name, latency))
+        if failures:
+            raise Error('Failed to send %s through: %s' % (event.event_id, ', '.join(failures)))
+        return latencies
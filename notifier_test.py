@@ -0,0 +1,169 @@
+import datetime
+import http.server
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import campsites
+import logger
+import notifier
+
+
+class MockCampsite(campsites.Campsite):
+    name = 'Mock Campsite'
+    site_regex = re.compile(r'.*')
+
+
+class WebhookReceiver(object):
+    """A local http server that records the json bodies POSTed to it."""
+
+    def __init__(self, status_codes=()):
+        self.bodies = []
+        self.event_ids = []
+        self.status_codes = list(status_codes)  # Returned by the first requests, then 200.
+        receiver = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                status_code = receiver.status_codes.pop(0) if receiver.status_codes else 200
+                if status_code == 200:
+                    receiver.bodies.append(json.loads(body))
+                    receiver.event_ids.append(self.headers['X-Event-Id'])
+                self.send_response(status_code)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%s/hook' % self.server.server_port
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def Stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class MockChannel(notifier.Channel):
+
+    def __init__(self, name, failures=0, delay_secs=0, timeout_secs=1):
+        super(MockChannel, self).__init__(name, timeout_secs=timeout_secs, retries=1, retry_delay_secs=0)
+        self.failures = failures
+        self.delay_secs = delay_secs
+        self.num_calls = 0
+        self.sent = []
+
+    def Send(self, event):
+        self.num_calls += 1
+        time.sleep(self.delay_secs)
+        if self.failures:
+            self.failures -= 1
+            raise IOError('mock failure')
+        self.sent.append(event.event_id)
+
+
+def MakeEvent(site='CB1', detected_at=None):
+    return notifier.ChangeEvent(
+        MockCampsite, datetime.date(2021, 5, 1), datetime.date(2021, 11, 1),
+        {site: [datetime.datetime(2021, 5, 14)]}, detected_at or time.time())
+
+
+class TestChangeEvent(object):
+
+    def testEventId_OnlyDependsOnAvailability(self):
+        event = MakeEvent()
+        assert MakeEvent(detected_at=event.detected_at + 600).event_id == event.event_id
+        assert MakeEvent('CB2', event.detected_at).event_id != event.event_id
+
+
+class TestDispatcher(object):
+
+    def testDispatch_FansOutToAllChannels(self):
+        receiver = WebhookReceiver(status_codes=[503])
+        path = os.path.join(tempfile.mkdtemp(), 'events.jsonl')
+        webhook = notifier.WebhookChannel(receiver.url, retry_delay_secs=0)
+        dispatcher = notifier.Dispatcher([webhook, notifier.FileChannel(path)], logger.Logger(False))
+        event = MakeEvent()
+        latencies = dispatcher.Dispatch(event)
+        receiver.Stop()
+
+        assert sorted(latencies) == sorted([webhook.name, 'file:%s' % path])
+        assert all(latency >= 0 for latency in latencies.values())
+        assert len(dispatcher.latencies) == 2
+        # The webhook was retried after the 503.
+        assert receiver.event_ids == [event.event_id]
+        assert receiver.bodies[0]['site_to_available_dates'] == {'CB1': ['2021-05-14']}
+        with open(path) as f:
+            assert json.loads(f.read())['event_id'] == event.event_id
+
+    def testDispatch_ChannelsRunInParallel(self):
+        channels = [MockChannel('a', delay_secs=0.3), MockChannel('b', delay_secs=0.3), MockChannel('c', delay_secs=0.3)]
+        dispatcher = notifier.Dispatcher(channels, logger.Logger(False))
+        start_time = time.time()
+        dispatcher.Dispatch(MakeEvent())
+        assert time.time() - start_time < 0.6
+
+    def testDispatch_HungChannelMissesDeadline(self):
+        fast = MockChannel('fast')
+        # Deadline of 0.1 secs for each of the 2 attempts, the send takes 1 sec.
+        hung = MockChannel('hung', delay_secs=1, timeout_secs=0.1)
+        dispatcher = notifier.Dispatcher([fast, hung], logger.Logger(False))
+        assert hung.GetDeadlineSecs() == 0.2
+        event = MakeEvent()
+        try:
+            dispatcher.Dispatch(event)
+            assert False, 'Expected notifier.Error'
+        except notifier.Error as e:
+            assert 'hung: timed out' in str(e)
+        assert fast.sent == [event.event_id]
+        assert hung.sent == []
+
+        # The hung send is still running, so it isn't started again.
+        try:
+            dispatcher.Dispatch(event)
+            assert False, 'Expected notifier.Error'
+        except notifier.Error as e:
+            assert 'hung: still sending' in str(e)
+        assert hung.num_calls == 1
+        dispatcher.sends['hung'].result()
+        assert hung.sent == [event.event_id]
+
+    def testDispatch_DeduplicatesPerChannel(self):
+        good = MockChannel('good')
+        flaky = MockChannel('flaky', failures=2)
+        dispatcher = notifier.Dispatcher([good, flaky], logger.Logger(False))
+        event = MakeEvent()
+        try:
+            dispatcher.Dispatch(event)
+            assert False, 'Expected notifier.Error'
+        except notifier.Error:
+            pass
+        assert good.sent == [event.event_id]
+        assert flaky.sent == []
+
+        # Dispatching again only retries the channel that failed.
+        dispatcher.Dispatch(event)
+        assert good.sent == [event.event_id]
+        assert flaky.sent == [event.event_id]
+
+        # A new event goes to every channel.
+        other_event = MakeEvent('CB2')
+        dispatcher.Dispatch(other_event)
+        assert good.sent == [event.event_id, other_event.event_id]
+
+        # Resending goes to every channel even if the event was delivered before.
+        dispatcher.Dispatch(event, resend=True)
+        assert good.sent == [event.event_id, other_event.event_id, event.event_id]
+        assert flaky.sent == [event.event_id, other_event.event_id, event.event_id]
+
+
+if __name__ == '__main__':
+    TestChangeEvent().testEventId_OnlyDependsOnAvailability()
+    TestDispatcher().testDispatch_FansOutToAllChannels()
+    TestDispatcher().testDispatch_ChannelsRunInParallel()
+    TestDispatcher().testDispatch_HungChannelMissesDeadline()
+    TestDispatcher().testDispatch_DeduplicatesPerChannel()
@@ -2,9 +2,21 @@
 a specific campsite and time range."""
 
 class Parser(object):
+    """Subclasses should set campsite_class to the campsites.Campsite base class they handle
+    and be registered in parser_registry."""
 
-    def __init__(self, logger):
+    campsite_class = None
+    host = None  # The host requests are sent to, used for rate limiting.
+
+    def __init__(self, logger, throttle=None):
         self.logger = logger
+        # Optional object with a Wait(host) method. If set it is called before every request
+        # and replaces the random sleeps between requests.
+        self.throttle = throttle
+
+    def _WaitForHost(self):
+        if self.throttle:
+            self.throttle.Wait(self.host)
 
     def ParseAvailability(self, campsite, start_date, end_date):
         raise NotImplementedError
@@ -1,5 +1,6 @@
 import parser_base
 import bs4
+import campsites
 import collections
 import random
 import requests
@@ -14,7 +15,12 @@ class Error(Exception):
 
 class ReserveAmericaParser(parser_base.Parser):
 
+    campsite_class = campsites.ReserveAmericaCampsite
+    host = 'www.reserveamerica.com'
+
     def _FuzzySleep(self):
+        if self.throttle:
+            return
         sleep_time_secs = random.uniform(1.0, 5.0)
         self.logger.Log('Sleeping for %s...' % sleep_time_secs)
         time.sleep(sleep_time_secs)
@@ -84,12 +90,17 @@ class ReserveAmericaParser(parser_base.Parser):
 
         self.logger.Log('Getting availability data from start_date %s' % dt.FormatDate(start_date))
         session = requests.Session()
-
-        self.logger.Log('Starting GET request to setup session cookies etc.')
-        session.get(campsite.request_url)
-
-        self.logger.Log('Starting POST request to retrieve 2 week availability data')
-        response = session.post(campsite.request_url, data=self._GetPostData(campsite.form_params, start_date))
+        try:
+            self.logger.Log('Starting GET request to setup session cookies etc.')
+            self._WaitForHost()
+            session.get(campsite.request_url)
+
+            self.logger.Log('Starting POST request to retrieve 2 week availability data')
+            self._WaitForHost()
+            response = session.post(campsite.request_url, data=self._GetPostData(campsite.form_params, start_date))
+        finally:
+            # Close the session even if a request fails so failing windows don't leak connections.
+            session.close()
 
         # Debugging response.
         # print response.text
@@ -100,7 +111,15 @@ class ReserveAmericaParser(parser_base.Parser):
 
         self.logger.Log('Parsing response')
         soup = bs4.BeautifulSoup(response.text, 'html5lib')
-
+        del response
+        try:
+            self._ParseCalendar(soup, start_date, site_to_available_dates)
+        finally:
+            # Parse trees are full of reference cycles, tear them down now instead of
+            # leaving them for the garbage collector.
+            soup.decompose()
+
+    def _ParseCalendar(self, soup, start_date, site_to_available_dates):
         self.logger.Log('Retreving calendar table')
         table = self._GetTable(soup)
 
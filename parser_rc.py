@@ -3,6 +3,7 @@ import datetime
 import random
 import requests
 import time
+import campsites
 import parser_base
 import datetime_util as dt
 
@@ -11,9 +12,31 @@ class Error(Exception):
     pass
 
 
+class ServerError(Error):
+    """A 5xx, 408 or 429 response, which says nothing about whether the request itself was valid."""
+
+
+TRANSIENT_STATUS_CODES = (408, 429)  # Timed out or rate limited, retrying later may succeed.
+
+
+GRID_URL = 'https://calirdr.usedirect.com/rdr/rdr/search/grid'
+
+
 class ReserveCaliforniaParser(parser_base.Parser):
 
+    campsite_class = campsites.ReserveCaliforniaCampsite
+    host = 'calirdr.usedirect.com'
+
+    def __init__(self, logger, throttle=None):
+        super(ReserveCaliforniaParser, self).__init__(logger, throttle)
+        self.unnarrowable_facility_ids = set()  # Facilities that don't support server side unit filters.
+        self.full_response_bytes = {}  # facility_id -> size of the latest unfiltered grid response.
+        self.bytes_received = 0
+        self.bytes_saved = 0  # Estimated bytes saved by narrowed requests.
+
     def _FuzzySleep(self):
+        if self.throttle:
+            return
         sleep_time_secs = random.uniform(1.0, 5.0)
         self.logger.Log('Sleeping for %s...' % sleep_time_secs)
         time.sleep(sleep_time_secs)
@@ -34,7 +57,7 @@ class ReserveCaliforniaParser(parser_base.Parser):
             'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.114 Safari/537.36'
         }
 
-    def _GetPostData(self, campsite, start_date):
+    def _GetPostData(self, campsite, start_date, narrowed=False):
         start_date_formatted = self._FormatDateForPost(start_date)
         max_date = start_date + datetime.timedelta(days=6*30)
         max_date_formatted = self._FormatDateForPost(max_date)
@@ -51,8 +74,80 @@ class ReserveCaliforniaParser(parser_base.Parser):
             "UnitTypesGroupIds": [],
             "MinDate": start_date_formatted,
             "MaxDate": max_date_formatted}
+        if narrowed:
+            data["UnitTypeId"] = campsite.unit_type_id
+            data["UnitCategoryId"] = campsite.unit_category_id
+            data["UnitTypesGroupIds"] = list(campsite.unit_types_group_ids)
         return data
 
+    def _ShouldNarrow(self, campsite):
+        return campsite.IsNarrowed() and campsite.facility_id not in self.unnarrowable_facility_ids
+
+    def _PostGrid(self, campsite, start_date, narrowed):
+        """Posts a grid search and returns a (units, response_bytes) tuple."""
+        data = self._GetPostData(campsite, start_date, narrowed)
+        self._WaitForHost()
+        response = requests.post(GRID_URL, json=data, headers=self._GetHeaders())
+
+        if response.status_code >= 500 or response.status_code in TRANSIENT_STATUS_CODES:
+            raise ServerError('Receive http code %s instead of 200' % response.status_code)
+        if response.status_code != 200:
+            raise Error('Receive http code %s instead of 200' % response.status_code)
+
+        response_bytes = len(response.content)
+        self.bytes_received += response_bytes
+        self.logger.Log('Parsing response as json, %s bytes (narrowed: %s)' % (response_bytes, narrowed))
+        json_response = response.json()
+        facility = json_response.get('Facility')
+        if not facility:
+            raise Error('Facility entry not found in json response')
+        units = facility.get('Units')
+        if not units:
+            raise Error('Units entry not found in json response')
+        return units, response_bytes
+
+    def _GetUnits(self, campsite, start_date):
+        """Gets the grid units for a window, narrowing the request server side when possible.
+
+        The first narrowed request for a facility is preceded by an unfiltered one so that
+        we know how big the full response is. If the server rejects the filters, with a 4xx or
+        a response without units, or doesn't make the response any smaller the facility is
+        marked as unnarrowable and from then on we send unfiltered requests and rely on the
+        site_regex filtering done by callers. Server errors, timeouts and rate limiting are
+        raised as is, so a transient outage doesn't turn narrowing off or send more requests.
+        """
+        facility_id = campsite.facility_id
+        if not self._ShouldNarrow(campsite):
+            units, response_bytes = self._PostGrid(campsite, start_date, False)
+            self.full_response_bytes[facility_id] = response_bytes
+            return units
+
+        full_units = None
+        if facility_id not in self.full_response_bytes:
+            self.logger.Log('Measuring unfiltered response size for facility %s' % facility_id)
+            full_units, self.full_response_bytes[facility_id] = self._PostGrid(campsite, start_date, False)
+        full_bytes = self.full_response_bytes[facility_id]
+
+        try:
+            units, response_bytes = self._PostGrid(campsite, start_date, True)
+        except ServerError:
+            raise
+        except Error as e:
+            self.logger.Log('Narrowed request failed for facility %s because %s, falling back to unfiltered requests' % (facility_id, e))
+            self.unnarrowable_facility_ids.add(facility_id)
+            if full_units is None:
+                full_units, self.full_response_bytes[facility_id] = self._PostGrid(campsite, start_date, False)
+            return full_units
+
+        if response_bytes >= full_bytes:
+            self.logger.Log('Facility %s ignores unit filters, falling back to unfiltered requests' % facility_id)
+            self.unnarrowable_facility_ids.add(facility_id)
+            return units
+
+        bytes_saved = full_bytes - response_bytes
+        self.bytes_saved += bytes_saved
+        self.logger.Log('Narrowed request saved ~%s bytes (%s vs %s unfiltered)' % (bytes_saved, response_bytes, full_bytes))
+        return units
 
     def _ValidateAndParseUnit(self, unit):
         site_name = unit.get('ShortName')
@@ -84,23 +179,7 @@ class ReserveCaliforniaParser(parser_base.Parser):
         Doesn't return anything but updates the site_to_available_dates dict.
         """
         self.logger.Log('Getting availability data from start_date %s' % dt.FormatDate(start_date))
-        data = self._GetPostData(campsite, start_date)
-        response = requests.post(
-            'https://calirdr.usedirect.com/rdr/rdr/search/grid',
-            json=data,
-            headers=self._GetHeaders())
-
-        if response.status_code != 200:
-            raise Error('Receive http code %s instead of 200' % first_response.status_code)
-
-        self.logger.Log('Parsing response as json')
-        json_response = response.json()
-        facility = json_response.get('Facility')
-        if not facility:
-            raise Error('Facility entry not found in json response')
-        units = facility.get('Units')
-        if not units:
-            raise Error('Units entry not found in json response')
+        units = self._GetUnits(campsite, start_date)
 
         self.logger.Log('Processing %s units' % len(units))
         for unit in units.values():
@@ -0,0 +1,140 @@
+import datetime
+import json
+import re
+import campsites
+import logger
+import parser_rc
+
+
+class MockCampsite(campsites.ReserveCaliforniaCampsite):
+    name = 'Mock Campsite'
+    site_regex = re.compile(r'CB.*')
+    facility_id = '1'
+
+
+class MockNarrowedCampsite(MockCampsite):
+    unit_category_id = 2
+
+
+class MockResponse(object):
+
+    def __init__(self, units, status_code=200):
+        self.status_code = status_code
+        self.content = json.dumps({'Facility': {'Units': units}}).encode()
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def MakeUnit(site_name, is_free):
+    return {'ShortName': site_name, 'Slices': {'a': {'Date': '2021-05-01', 'IsFree': is_free}}}
+
+
+class MockRequests(object):
+    """Stands in for the requests module, serving canned grid responses."""
+
+    def __init__(self, full_units, narrowed_response):
+        self.full_units = full_units
+        self.narrowed_response = narrowed_response
+        self.posts = []
+
+    def post(self, url, json=None, headers=None):
+        self.posts.append(json)
+        if json['UnitCategoryId'] or json['UnitTypeId'] or json['UnitTypesGroupIds']:
+            return self.narrowed_response
+        return MockResponse(self.full_units)
+
+
+class TestReserveCaliforniaParser(object):
+
+    def MockOutRequests(self, narrowed_response):
+        full_units = {'1': MakeUnit('CB1', True), '2': MakeUnit('CP1', True), '3': MakeUnit('CP2', True)}
+        mock_requests = MockRequests(full_units, narrowed_response)
+        parser_rc.requests = mock_requests
+        return mock_requests
+
+    def testGetAvailability_NotNarrowed(self):
+        mock_requests = self.MockOutRequests(None)
+        parser = parser_rc.ReserveCaliforniaParser(logger.Logger(False))
+        site_to_available_dates = {'CB1': [], 'CP1': [], 'CP2': []}
+        parser._GetAvailability(MockCampsite, datetime.date(2021, 5, 1), site_to_available_dates)
+        assert len(mock_requests.posts) == 1
+        assert mock_requests.posts[0]['UnitCategoryId'] == 0
+        assert len(site_to_available_dates['CP1']) == 1
+        assert parser.bytes_saved == 0
+
+    def testGetAvailability_Narrowed(self):
+        mock_requests = self.MockOutRequests(MockResponse({'1': MakeUnit('CB1', True)}))
+        parser = parser_rc.ReserveCaliforniaParser(logger.Logger(False))
+        site_to_available_dates = {'CB1': [], 'CP1': [], 'CP2': []}
+        start_date = datetime.date(2021, 5, 1)
+        parser._GetAvailability(MockNarrowedCampsite, start_date, site_to_available_dates)
+        parser._GetAvailability(MockNarrowedCampsite, start_date, site_to_available_dates)
+        # Only the first window measures the unfiltered response size.
+        assert [p['UnitCategoryId'] for p in mock_requests.posts] == [0, 2, 2]
+        assert len(site_to_available_dates['CB1']) == 2
+        assert site_to_available_dates['CP1'] == []
+        assert parser.bytes_saved > 0
+
+    def testGetAvailability_NarrowingRejectedFallsBack(self):
+        mock_requests = self.MockOutRequests(MockResponse({}))
+        parser = parser_rc.ReserveCaliforniaParser(logger.Logger(False))
+        site_to_available_dates = {'CB1': [], 'CP1': [], 'CP2': []}
+        start_date = datetime.date(2021, 5, 1)
+        parser._GetAvailability(MockNarrowedCampsite, start_date, site_to_available_dates)
+        parser._GetAvailability(MockNarrowedCampsite, start_date, site_to_available_dates)
+        assert [p['UnitCategoryId'] for p in mock_requests.posts] == [0, 2, 0]
+        assert len(site_to_available_dates['CP1']) == 2
+        assert MockNarrowedCampsite.facility_id in parser.unnarrowable_facility_ids
+
+    def testGetAvailability_NarrowingIgnoredFallsBack(self):
+        full_units = {'1': MakeUnit('CB1', True), '2': MakeUnit('CP1', True), '3': MakeUnit('CP2', True)}
+        mock_requests = self.MockOutRequests(MockResponse(full_units))
+        parser = parser_rc.ReserveCaliforniaParser(logger.Logger(False))
+        site_to_available_dates = {'CB1': [], 'CP1': [], 'CP2': []}
+        start_date = datetime.date(2021, 5, 1)
+        parser._GetAvailability(MockNarrowedCampsite, start_date, site_to_available_dates)
+        parser._GetAvailability(MockNarrowedCampsite, start_date, site_to_available_dates)
+        assert [p['UnitCategoryId'] for p in mock_requests.posts] == [0, 2, 0]
+        assert parser.bytes_saved == 0
+
+    def testGetAvailability_ServerErrorKeepsNarrowing(self):
+        mock_requests = self.MockOutRequests(MockResponse({}, status_code=503))
+        parser = parser_rc.ReserveCaliforniaParser(logger.Logger(False))
+        site_to_available_dates = {'CB1': [], 'CP1': [], 'CP2': []}
+        start_date = datetime.date(2021, 5, 1)
+        try:
+            parser._GetAvailability(MockNarrowedCampsite, start_date, site_to_available_dates)
+            assert False, 'Expected parser_rc.ServerError'
+        except parser_rc.ServerError:
+            pass
+        assert MockNarrowedCampsite.facility_id not in parser.unnarrowable_facility_ids
+
+        # Once the server recovers narrowed requests are sent again.
+        mock_requests.narrowed_response = MockResponse({'1': MakeUnit('CB1', True)})
+        parser._GetAvailability(MockNarrowedCampsite, start_date, site_to_available_dates)
+        assert [p['UnitCategoryId'] for p in mock_requests.posts] == [0, 2, 2]
+        assert len(site_to_available_dates['CB1']) == 1
+
+    def testGetAvailability_RateLimitedKeepsNarrowing(self):
+        for status_code in parser_rc.TRANSIENT_STATUS_CODES:
+            mock_requests = self.MockOutRequests(MockResponse({}, status_code=status_code))
+            parser = parser_rc.ReserveCaliforniaParser(logger.Logger(False))
+            site_to_available_dates = {'CB1': [], 'CP1': [], 'CP2': []}
+            try:
+                parser._GetAvailability(MockNarrowedCampsite, datetime.date(2021, 5, 1), site_to_available_dates)
+                assert False, 'Expected parser_rc.ServerError'
+            except parser_rc.ServerError:
+                pass
+            # No unfiltered request is sent after being rate limited.
+            assert [p['UnitCategoryId'] for p in mock_requests.posts] == [0, 2]
+            assert parser.unnarrowable_facility_ids == set()
+
+
+if __name__ == '__main__':
+    TestReserveCaliforniaParser().testGetAvailability_NotNarrowed()
+    TestReserveCaliforniaParser().testGetAvailability_Narrowed()
+    TestReserveCaliforniaParser().testGetAvailability_NarrowingRejectedFallsBack()
+    TestReserveCaliforniaParser().testGetAvailability_NarrowingIgnoredFallsBack()
+    TestReserveCaliforniaParser().testGetAvailability_ServerErrorKeepsNarrowing()
+    TestReserveCaliforniaParser().testGetAvailability_RateLimitedKeepsNarrowing()
@@ -0,0 +1,71 @@
+"""Registry of parser backends keyed by the Campsite base class they handle.
+
+Backends are registered by module and class name so that a parser module, and
+any heavy dependencies it pulls in, is only imported the first time a campsite
+that needs it is looked up. Each parser class declares the campsite base class
+it handles through its campsite_class attribute, which is checked on load.
+
+To add a backend, create a parser_base.Parser subclass in its own module and
+add a RegisterBackend call at the bottom of this file.
+"""
+import importlib
+import campsites
+
+
+class Error(Exception):
+    pass
+
+
+_BACKENDS = {}  # Campsite base class -> (module name, parser class name).
+_LOADED_PARSER_CLASSES = {}  # Campsite base class -> loaded parser class.
+
+
+def RegisterBackend(campsite_class, module_name, parser_class_name):
+    _BACKENDS[campsite_class] = (module_name, parser_class_name)
+    _LOADED_PARSER_CLASSES.pop(campsite_class, None)
+
+
+def _FindBackendCampsiteClass(campsite):
+    # Walk the mro so that the most specific registered base class wins.
+    for cls in campsite.__mro__:
+        if cls in _BACKENDS:
+            return cls
+    raise Error('No parser backend registered for campsite class: %s' % campsite.__name__)
+
+
+def _LoadParserClass(campsite_class):
+    module_name, parser_class_name = _BACKENDS[campsite_class]
+    module = importlib.import_module(module_name)
+    parser_class = getattr(module, parser_class_name, None)
+    if parser_class is None:
+        raise Error('%s not found in module %s' % (parser_class_name, module_name))
+    if getattr(parser_class, 'campsite_class', None) is not campsite_class:
+        raise Error('%s.%s does not declare campsite_class = %s' % (
+            module_name, parser_class_name, campsite_class.__name__))
+    return parser_class
+
+
+def HasBackend(campsite):
+    try:
+        _FindBackendCampsiteClass(campsite)
+    except Error:
+        return False
+    return True
+
+
+def GetParserClass(campsite):
+    campsite_class = _FindBackendCampsiteClass(campsite)
+    parser_class = _LOADED_PARSER_CLASSES.get(campsite_class)
+    if parser_class is None:
+        parser_class = _LoadParserClass(campsite_class)
+        _LOADED_PARSER_CLASSES[campsite_class] = parser_class
+    return parser_class
+
+
+def GetParser(campsite, logger, throttle=None):
+    return GetParserClass(campsite)(logger, throttle)
+
+
+RegisterBackend(campsites.ReserveAmericaCampsite, 'parser_ra', 'ReserveAmericaParser')
+RegisterBackend(campsites.ReserveCaliforniaCampsite, 'parser_rc', 'ReserveCaliforniaParser')
+RegisterBackend(campsites.RecreationGovCampsite, 'parser_rg', 'RecreationGovParser')
@@ -0,0 +1,48 @@
+import re
+import subprocess
+import sys
+import campsites
+import logger
+import parser_base
+import parser_registry
+
+
+class MockCampsite(campsites.Campsite):
+    name = 'Mock Campsite'
+    site_regex = re.compile(r'.*')
+
+
+class MockSteepRavine(campsites.SteepRavine):
+    pass
+
+
+class TestParserRegistry(object):
+
+    def testGetParser_MostSpecificBaseClass(self):
+        parser = parser_registry.GetParser(MockSteepRavine, logger.Logger(False))
+        assert isinstance(parser, parser_base.Parser)
+        assert parser.campsite_class is campsites.ReserveCaliforniaCampsite
+
+    def testGetParser_UnknownCampsite(self):
+        assert not parser_registry.HasBackend(MockCampsite)
+        try:
+            parser_registry.GetParser(MockCampsite, logger.Logger(False))
+        except parser_registry.Error:
+            return
+        assert False, 'Expected parser_registry.Error'
+
+    def testGetParser_OnlyLoadsNeededBackend(self):
+        # Run in a fresh interpreter so modules imported by other tests don't interfere.
+        code = '\n'.join([
+            'import sys, find_cabin_availability, logger',
+            'find_cabin_availability.GetParser(find_cabin_availability.SteepRavine, logger.Logger(False))',
+            'print("parser_rc" in sys.modules, "parser_ra" in sys.modules, "bs4" in sys.modules)',
+        ])
+        output = subprocess.check_output([sys.executable, '-c', code]).decode().split()
+        assert output == ['True', 'False', 'False']
+
+
+if __name__ == '__main__':
+    TestParserRegistry().testGetParser_MostSpecificBaseClass()
+    TestParserRegistry().testGetParser_UnknownCampsite()
+    TestParserRegistry().testGetParser_OnlyLoadsNeededBackend()
@@ -0,0 +1,122 @@
+import collections
+import concurrent.futures
+import datetime
+import requests
+import campsites
+import parser_base
+import datetime_util as dt
+
+
+class Error(Exception):
+    pass
+
+
+MONTH_URL = 'https://www.recreation.gov/api/camps/availability/campground/%s/month'
+MAX_CONCURRENT_REQUESTS = 3
+REQUEST_TIMEOUT_SECS = 30
+
+
+class RecreationGovParser(parser_base.Parser):
+    """Reads availability from recreation.gov's monthly availability endpoint.
+
+    Each request returns a whole calendar month for every site in the campground, so
+    the 6 month search window only takes a handful of requests which are made concurrently.
+    """
+
+    campsite_class = campsites.RecreationGovCampsite
+    host = 'www.recreation.gov'
+
+    def _GetHeaders(self):
+        # Use these headers so that requests aren't rejected because its a script calling them.
+        return {
+            'accept': 'application/json, text/plain, */*',
+            'referer': 'https://www.recreation.gov/',
+            'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.114 Safari/537.36'
+        }
+
+    def _GetMonthStarts(self, start_date, end_date):
+        month_starts = []
+        month_start = datetime.date(start_date.year, start_date.month, 1)
+        while month_start < end_date:
+            month_starts.append(month_start)
+            if month_start.month == 12:
+                month_start = datetime.date(month_start.year + 1, 1, 1)
+            else:
+                month_start = datetime.date(month_start.year, month_start.month + 1, 1)
+        return month_starts
+
+    def _GetMonthAvailability(self, campsite, month_start):
+        """Gets the availability json document for the month starting at month_start."""
+        self.logger.Log('Getting availability data for month %s' % dt.FormatDate(month_start))
+        self._WaitForHost()
+        response = requests.get(
+            MONTH_URL % campsite.campground_id,
+            params={'start_date': month_start.strftime(r'%Y-%m-%dT00:00:00.000Z')},
+            headers=self._GetHeaders(),
+            timeout=REQUEST_TIMEOUT_SECS)
+
+        if response.status_code != 200:
+            raise Error('Receive http code %s instead of 200' % response.status_code)
+        return response.json()
+
+    def _GetSiteKeys(self, sites):
+        """Returns a {campsite_id: site key} dict.
+
+        Sites are keyed by name, so site_regex can match them, but names can repeat across loops,
+        so repeated names get the loop, or campsite id if there's no loop, appended in brackets.
+        """
+        name_counts = collections.Counter(site_info.get('site') for site_info in sites.values())
+        site_keys = {}
+        for campsite_id, site_info in sites.items():
+            site_name = site_info.get('site')
+            if not site_name:
+                continue
+            if name_counts[site_name] > 1:
+                site_name = '%s (%s)' % (site_name, site_info.get('loop') or campsite_id)
+            site_keys[campsite_id] = site_name
+        return site_keys
+
+    def _ParseMonth(self, json_response, start_date, end_date, site_to_available_dates):
+        """Adds available dates between start_date and end_date to site_to_available_dates."""
+        sites = json_response.get('campsites')
+        if sites is None:
+            raise Error('campsites entry not found in json response')
+
+        self.logger.Log('Processing %s sites' % len(sites))
+        site_keys = self._GetSiteKeys(sites)
+        seen_site_keys = set()
+        for campsite_id, site_info in sites.items():
+            site_name = site_keys.get(campsite_id)
+            if not site_name:
+                self.logger.Log('Found invalid site "%s" because site field is missing ...' % site_info)
+                continue
+            if site_name in seen_site_keys:
+                self.logger.Log('Skipping duplicate site "%s" ...' % site_name)
+                continue
+            seen_site_keys.add(site_name)
+            available_dates = []
+            for str_date, status in site_info.get('availabilities', {}).items():
+                if status != 'Available':
+                    continue
+                date = datetime.datetime.strptime(str_date[:10], r'%Y-%m-%d')
+                if start_date <= date.date() < end_date:
+                    available_dates.append(date)
+            if available_dates:
+                site_to_available_dates[site_name].extend(sorted(available_dates))
+
+    def ParseAvailability(self, campsite, start_date, end_date):
+        """Gets availability between start_date and end_date from recreation.gov for the specified campsite.
+
+        Returns site_to_available_dates dict.
+        """
+        self.logger.Log('Retrieving availability from %s to %s' % (dt.FormatDate(start_date), dt.FormatDate(end_date)))
+        month_starts = self._GetMonthStarts(start_date, end_date)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+            json_responses = list(executor.map(
+                lambda month_start: self._GetMonthAvailability(campsite, month_start), month_starts))
+
+        site_to_available_dates = collections.defaultdict(list)
+        # Parse in month order so each site's dates stay sorted.
+        for json_response in json_responses:
+            self._ParseMonth(json_response, start_date, end_date, site_to_available_dates)
+        return site_to_available_dates
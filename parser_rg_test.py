@@ -0,0 +1,118 @@
+import collections
+import datetime
+import json
+import os
+import re
+import sys
+import campsites
+import logger
+import parser_rg
+
+TESTDATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata')
+# Fixtures are testdata/recreation_gov_<campground_id>_<YYYY-MM>.json. The synthetic ones follow
+# the endpoint's response format, run this file with --record to add recorded ones.
+FIXTURE_PATH = os.path.join(TESTDATA_DIR, 'recreation_gov_%s_%s.json')
+MAX_RECORDED_SITES = 5
+
+
+class MockCampsite(campsites.RecreationGovCampsite):
+    name = 'Mock Campsite'
+    site_regex = re.compile(r'.*')
+    campground_id = 'synthetic'
+
+
+class MockResponse(object):
+
+    def __init__(self, path, status_code=200):
+        self.status_code = status_code
+        self.path = path
+
+    def json(self):
+        with open(self.path) as f:
+            return json.load(f)
+
+
+class MockRequests(object):
+    """Stands in for the requests module, serving month documents from testdata."""
+
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.urls.append((url, params['start_date']))
+        campground_id = url.split('/')[-2]
+        path = FIXTURE_PATH % (campground_id, params['start_date'][:7])
+        if not os.path.exists(path):
+            return MockResponse(path, status_code=404)
+        return MockResponse(path)
+
+
+class TestRecreationGovParser(object):
+
+    def testGetMonthStarts(self):
+        parser = parser_rg.RecreationGovParser(logger.Logger(False))
+        month_starts = parser._GetMonthStarts(datetime.date(2021, 11, 20), datetime.date(2022, 2, 1))
+        assert month_starts == [datetime.date(2021, 11, 1), datetime.date(2021, 12, 1), datetime.date(2022, 1, 1)]
+
+    def testParseAvailability(self):
+        mock_requests = MockRequests()
+        parser_rg.requests = mock_requests
+        parser = parser_rg.RecreationGovParser(logger.Logger(False))
+        site_to_available_dates = parser.ParseAvailability(
+            MockCampsite, datetime.date(2021, 5, 2), datetime.date(2021, 6, 3))
+        assert sorted(start_date for _, start_date in mock_requests.urls) == [
+            '2021-05-01T00:00:00.000Z', '2021-06-01T00:00:00.000Z']
+        # May 1st is before the start date and June 3rd is not before the end date.
+        assert dict(site_to_available_dates) == {'001': [
+            datetime.datetime(2021, 5, 14), datetime.datetime(2021, 5, 15),
+            datetime.datetime(2021, 5, 31), datetime.datetime(2021, 6, 2)]}
+
+    def testParseMonth_RepeatedSiteNames(self):
+        parser = parser_rg.RecreationGovParser(logger.Logger(False))
+        json_response = {'campsites': {
+            '1': {'site': '001', 'loop': 'A', 'availabilities': {'2021-05-02T00:00:00Z': 'Available'}},
+            '2': {'site': '001', 'loop': 'B', 'availabilities': {'2021-05-03T00:00:00Z': 'Available'}},
+            '3': {'site': '002', 'loop': 'B', 'availabilities': {'2021-05-04T00:00:00Z': 'Available'}},
+        }}
+        site_to_available_dates = collections.defaultdict(list)
+        parser._ParseMonth(json_response, datetime.date(2021, 5, 1), datetime.date(2021, 6, 1), site_to_available_dates)
+        assert dict(site_to_available_dates) == {
+            '001 (A)': [datetime.datetime(2021, 5, 2)],
+            '001 (B)': [datetime.datetime(2021, 5, 3)],
+            '002': [datetime.datetime(2021, 5, 4)]}
+
+    def testParseAvailability_HttpError(self):
+        parser_rg.requests = MockRequests()
+        parser = parser_rg.RecreationGovParser(logger.Logger(False))
+        try:
+            parser.ParseAvailability(MockCampsite, datetime.date(2021, 6, 2), datetime.date(2021, 7, 3))
+        except parser_rg.Error:
+            return
+        assert False, 'Expected parser_rg.Error'
+
+
+def RecordFixture(campground_id, month):
+    """Fetches a month document from recreation.gov and saves it, trimmed to a few sites, as a fixture."""
+    import requests
+    parser_rg.requests = requests
+    month_start = datetime.datetime.strptime(month, r'%Y-%m').date()
+    parser = parser_rg.RecreationGovParser(logger.Logger(False))
+    campsite = type('RecordedCampsite', (MockCampsite,), {'campground_id': campground_id})
+    json_response = parser._GetMonthAvailability(campsite, month_start)
+    site_ids = sorted(json_response['campsites'])[:MAX_RECORDED_SITES]
+    json_response['campsites'] = dict((site_id, json_response['campsites'][site_id]) for site_id in site_ids)
+    path = FIXTURE_PATH % (campground_id, month)
+    with open(path, 'w') as f:
+        json.dump(json_response, f, indent=2, sort_keys=True)
+    print('Recorded %s' % path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--record':
+        # python parser_rg_test.py --record <CAMPGROUND_ID> <YYYY-MM>
+        RecordFixture(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+    TestRecreationGovParser().testGetMonthStarts()
+    TestRecreationGovParser().testParseAvailability()
+    TestRecreationGovParser().testParseMonth_RepeatedSiteNames()
+    TestRecreationGovParser().testParseAvailability_HttpError()
@@ -0,0 +1,143 @@
+"""On demand profiling of polling passes.
+
+Profiling is off until requested, either by sending the process SIGUSR1 or by creating the
+control file. The control file may contain the number of passes to profile, otherwise
+default_passes are profiled. The file is removed once it has been read.
+
+While active every (campsite, phase) gets its own cProfile profile, and tracemalloc snapshots
+taken before and after the phase, written to output_dir once the requested passes are done:
+
+    <timestamp>-<campsite>-<phase>.prof                Readable by pstats, snakeviz etc.
+    <timestamp>-<campsite>-<phase>-before.tracemalloc  Readable by tracemalloc.Snapshot.load.
+    <timestamp>-<campsite>-<phase>-after.tracemalloc
+    <timestamp>-<campsite>-<phase>-diff.txt            The lines whose allocations grew the most
+                                                       during the phase.
+    <timestamp>-all.prof                               All phases merged.
+
+Profiles accumulate over the profiled passes, the snapshots are from the last one.
+
+cProfile only sees the thread that runs the phase. Work a phase hands to worker threads, such as
+the recreation.gov month fetches in parser_rg and the channel sends in notifier, shows up as time
+spent waiting on the results (lock acquire) rather than as its own calls. tracemalloc traces
+every thread, so their allocations are in the snapshots.
+
+When profiling is off Phase returns a shared no-op context manager, so callers pay for one
+attribute check per phase.
+"""
+import contextlib
+import cProfile
+import os
+import pstats
+import signal
+import time
+import tracemalloc
+
+
+NULL_PHASE = contextlib.nullcontext()
+MAX_DIFF_LINES = 50  # Lines written to each phase's allocation diff.
+
+
+class Profiler(object):
+
+    def __init__(self, output_dir, logger, control_file=None, default_passes=1):
+        self.output_dir = output_dir
+        self.logger = logger
+        self.control_file = control_file
+        self.default_passes = default_passes
+        self.requested_passes = 0  # Passes requested by a signal or the control file, not started yet.
+        self.remaining_passes = 0  # Passes left to profile, non zero while profiling is active.
+        self.profiles = {}  # (campsite name, phase) -> cProfile.Profile.
+        self.snapshots = {}  # (campsite name, phase) -> latest (before, after) tracemalloc.Snapshots.
+        self.started_tracemalloc = False
+
+    def InstallSignalHandler(self, signum=getattr(signal, 'SIGUSR1', None)):
+        if signum is None:
+            return  # Not supported on this platform, the control file still works.
+
+        def HandleSignal(signum, frame):
+            # Only record the request, profiling starts with the next pass.
+            self.requested_passes = self.default_passes
+
+        signal.signal(signum, HandleSignal)
+
+    def _ReadControlFile(self):
+        if not self.control_file or not os.path.exists(self.control_file):
+            return
+        with open(self.control_file) as f:
+            contents = f.read().strip()
+        os.remove(self.control_file)
+        self.requested_passes = int(contents) if contents.isdigit() else self.default_passes
+
+    def IsActive(self):
+        return self.remaining_passes > 0
+
+    def StartPass(self):
+        """Starts profiling if it has been requested since the last pass. Call before each pass."""
+        if self.IsActive():
+            return
+        self._ReadControlFile()
+        if not self.requested_passes:
+            return
+        self.logger.Log('Profiling the next %s passes' % self.requested_passes)
+        self.remaining_passes = self.requested_passes
+        self.requested_passes = 0
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+
+    def EndPass(self):
+        """Writes the profiles once the requested passes are done. Call after each pass."""
+        if not self.IsActive():
+            return
+        self.remaining_passes -= 1
+        if self.remaining_passes == 0:
+            self._WriteResults()
+
+    def Phase(self, campsite, phase):
+        """Returns a context manager that profiles the code it wraps as phase of campsite's pass."""
+        if not self.remaining_passes:
+            return NULL_PHASE
+        return self._ProfilePhase((campsite.__name__, phase))
+
+    @contextlib.contextmanager
+    def _ProfilePhase(self, key):
+        profile = self.profiles.get(key)
+        if profile is None:
+            profile = self.profiles[key] = cProfile.Profile()
+        before = self._TakeSnapshot()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self.snapshots[key] = (before, self._TakeSnapshot())
+
+    def _TakeSnapshot(self):
+        # Leave out the memory tracemalloc uses to record the snapshots themselves.
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    def _WriteResults(self):
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+        prefix = os.path.join(self.output_dir, time.strftime('%Y%m%d-%H%M%S'))
+        prof_paths = []
+        for (campsite_name, phase), profile in sorted(self.profiles.items()):
+            path = '%s-%s-%s.prof' % (prefix, campsite_name, phase)
+            profile.dump_stats(path)
+            prof_paths.append(path)
+        for (campsite_name, phase), (before, after) in sorted(self.snapshots.items()):
+            phase_prefix = '%s-%s-%s' % (prefix, campsite_name, phase)
+            before.dump(phase_prefix + '-before.tracemalloc')
+            after.dump(phase_prefix + '-after.tracemalloc')
+            with open(phase_prefix + '-diff.txt', 'w') as f:
+                for stat in after.compare_to(before, 'lineno')[:MAX_DIFF_LINES]:
+                    f.write('%s\n' % stat)
+        if prof_paths:
+            pstats.Stats(*prof_paths).dump_stats('%s-all.prof' % prefix)
+        self.logger.Log('Wrote %s profiles to %s' % (len(prof_paths), self.output_dir))
+
+        self.profiles = {}
+        self.snapshots = {}
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
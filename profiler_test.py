@@ -0,0 +1,71 @@
+import os
+import pstats
+import re
+import shutil
+import tempfile
+import tracemalloc
+import campsites
+import logger
+import profiler
+
+
+class MockCampsite(campsites.Campsite):
+    name = 'Mock Campsite'
+    site_regex = re.compile(r'.*')
+
+
+class TestProfiler(object):
+
+    def MakeProfiler(self):
+        temp_dir = tempfile.mkdtemp()
+        return profiler.Profiler(
+            os.path.join(temp_dir, 'profiles'), logger.Logger(False),
+            control_file=os.path.join(temp_dir, 'profile.ctl'))
+
+    def testPhase_InactiveIsNoop(self):
+        prof = self.MakeProfiler()
+        prof.StartPass()
+        assert not prof.IsActive()
+        assert prof.Phase(MockCampsite, 'parser') is profiler.NULL_PHASE
+        prof.EndPass()
+        assert not os.path.exists(prof.output_dir)
+        shutil.rmtree(os.path.dirname(prof.output_dir))
+
+    def testPhase_ControlFileProfilesRequestedPasses(self):
+        prof = self.MakeProfiler()
+        with open(prof.control_file, 'w') as f:
+            f.write('2\n')
+        allocated = []
+        for _ in range(3):
+            prof.StartPass()
+            with prof.Phase(MockCampsite, 'parser'):
+                sorted(range(1000))
+                allocated.append([str(i) for i in range(10000)])
+            with prof.Phase(MockCampsite, 'email'):
+                pass
+            if prof.IsActive():
+                assert not os.path.exists(prof.output_dir)
+            prof.EndPass()
+
+        assert not os.path.exists(prof.control_file)
+        assert not prof.IsActive()
+        assert not tracemalloc.is_tracing()
+        file_names = os.listdir(prof.output_dir)
+        # A profile, before and after snapshots and a diff per phase, and the merged profile.
+        assert len(file_names) == 9
+        parser_prof = [n for n in file_names if n.endswith('-MockCampsite-parser.prof')][0]
+        stats = pstats.Stats(os.path.join(prof.output_dir, parser_prof))
+        sorted_calls = [v for k, v in stats.stats.items() if k[2] == "<built-in method builtins.sorted>"]
+        assert sorted_calls[0][0] == 2  # Called once in each of the 2 profiled passes.
+        snapshot_name = [n for n in file_names if n.endswith('-MockCampsite-parser-after.tracemalloc')][0]
+        tracemalloc.Snapshot.load(os.path.join(prof.output_dir, snapshot_name))
+        # The diff only shows what the phase allocated, the list comprehension above.
+        diff_name = [n for n in file_names if n.endswith('-MockCampsite-parser-diff.txt')][0]
+        with open(os.path.join(prof.output_dir, diff_name)) as f:
+            assert 'profiler_test.py' in f.readline()
+        shutil.rmtree(os.path.dirname(prof.output_dir))
+
+
+if __name__ == '__main__':
+    TestProfiler().testPhase_InactiveIsNoop()
+    TestProfiler().testPhase_ControlFileProfilesRequestedPasses()
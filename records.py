@@ -0,0 +1,60 @@
+"""Compact records for availability results that are kept around between runs."""
+import array
+import datetime
+import sys
+
+
+class Snapshot(object):
+    """An immutable, compact copy of a site_to_available_dates dict.
+
+    Site names are interned and each site's dates are stored as a sorted array of date
+    ordinals, instead of a list of datetime objects.
+    """
+
+    __slots__ = ('sites', 'days')
+
+    def __init__(self, sites, days):
+        self.sites = sites  # Sorted tuple of site names.
+        self.days = days  # Tuple of array('i') date ordinals, one per site.
+
+    @classmethod
+    def FromSiteDates(cls, site_to_available_dates):
+        sites = tuple(sorted(sys.intern(site) for site in site_to_available_dates))
+        days = tuple(
+            array.array('i', sorted(set(date.toordinal() for date in site_to_available_dates[site])))
+            for site in sites)
+        return cls(sites, days)
+
+    def ToSiteDates(self):
+        return dict(
+            (site, [datetime.date.fromordinal(day) for day in days])
+            for site, days in zip(self.sites, self.days))
+
+    def __eq__(self, other):
+        if not isinstance(other, Snapshot):
+            return NotImplemented
+        return self.sites == other.sites and self.days == other.days
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __len__(self):
+        return len(self.sites)
+
+    def Diff(self, previous):
+        """Returns (added, removed) site -> sorted list of dates dicts, going from previous to this snapshot."""
+        previous_days = dict(zip(previous.sites, previous.days)) if previous is not None else {}
+        current_days = dict(zip(self.sites, self.days))
+        added = {}
+        removed = {}
+        for site in sorted(set(previous_days) | set(current_days)):
+            before = set(previous_days.get(site, ()))
+            after = set(current_days.get(site, ()))
+            if after - before:
+                added[site] = [datetime.date.fromordinal(day) for day in sorted(after - before)]
+            if before - after:
+                removed[site] = [datetime.date.fromordinal(day) for day in sorted(before - after)]
+        return added, removed
@@ -0,0 +1,132 @@
+"""A small read only HTTP API serving the latest availability found for each campsite.
+
+    GET /status               All campsites.
+    GET /status/<CLASS_NAME>  One campsite, CLASS_NAME being its class name in campsites.py.
+
+Responses are json rendered once per snapshot version, when the availability actually
+changes, and served from memory. Only age_secs and polled_at are filled in per request.
+Each response has a weak ETag for its snapshot version so clients can poll with
+If-None-Match and get a 304 back. Serving requests never triggers a scrape.
+"""
+import http.server
+import json
+import threading
+import time
+import records
+
+
+class _CampsiteStatus(object):
+
+    __slots__ = ('snapshot', 'version', 'polled_at', 'body_tail', 'etag')
+
+    def __init__(self, snapshot, version, polled_at, body_tail):
+        self.snapshot = snapshot
+        self.version = version
+        self.polled_at = polled_at
+        self.body_tail = body_tail  # Pre-rendered json object without its opening brace.
+        self.etag = 'W/"%s"' % version
+
+
+def _DatesJson(site_to_dates):
+    return dict((site, [date.isoformat() for date in dates]) for site, dates in site_to_dates.items())
+
+
+class StatusCache(object):
+    """Latest availability per campsite, shared between the polling loop and the server."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.statuses = {}  # Campsite class name -> _CampsiteStatus.
+        self.version = 0  # Bumped whenever any campsite's snapshot changes.
+
+    def Update(self, campsite, site_to_available_dates, polled_at):
+        snapshot = records.Snapshot.FromSiteDates(site_to_available_dates)
+        with self.lock:
+            status = self.statuses.get(campsite.__name__)
+            if status is not None and status.snapshot == snapshot:
+                status.polled_at = polled_at
+                return
+            if status is None:
+                last_diff = None
+            else:
+                added, removed = snapshot.Diff(status.snapshot)
+                last_diff = {'added': _DatesJson(added), 'removed': _DatesJson(removed)}
+            self.version += 1
+            body = json.dumps({
+                'campsite': campsite.name,
+                'version': self.version,
+                'changed_at': int(polled_at),
+                'sites': _DatesJson(snapshot.ToSiteDates()),
+                'last_diff': last_diff,
+            }, sort_keys=True).encode()
+            self.statuses[campsite.__name__] = _CampsiteStatus(snapshot, self.version, polled_at, body[1:])
+
+    def _Render(self, status, now):
+        return b'{"age_secs": %d, "polled_at": %d, ' % (max(now - status.polled_at, 0), status.polled_at) + status.body_tail
+
+    def GetCampsite(self, class_name, now):
+        """Returns an (etag, body) tuple for the campsite, or None if it hasn't been polled yet."""
+        with self.lock:
+            status = self.statuses.get(class_name)
+            if status is None:
+                return None
+            return status.etag, self._Render(status, now)
+
+    def GetAll(self, now):
+        """Returns an (etag, body) tuple for all campsites."""
+        with self.lock:
+            parts = [b'"%s": %s' % (name.encode(), self._Render(status, now))
+                     for name, status in sorted(self.statuses.items())]
+            return 'W/"%s"' % self.version, b'{"campsites": {' + b', '.join(parts) + b'}}'
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        now = time.time()
+        path = self.path.split('?')[0].rstrip('/')
+        if path == '/status':
+            result = self.server.status_cache.GetAll(now)
+        elif path.startswith('/status/'):
+            result = self.server.status_cache.GetCampsite(path[len('/status/'):], now)
+        else:
+            result = None
+        if result is None:
+            self.send_error(404)
+            return
+
+        etag, body = result
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # Don't print a line per request.
+
+
+class StatusServer(object):
+    """Serves status_cache on a background thread."""
+
+    def __init__(self, status_cache, port, host=''):
+        self.httpd = http.server.ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.status_cache = status_cache
+        self.port = self.httpd.server_port
+        self.thread = None
+
+    def Start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def Stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
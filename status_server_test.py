@@ -0,0 +1,63 @@
+import datetime
+import json
+import re
+import time
+import urllib.error
+import urllib.request
+import campsites
+import status_server
+
+
+class MockCampsite(campsites.Campsite):
+    name = 'Mock Campsite'
+    site_regex = re.compile(r'.*')
+
+
+def Get(url, etag=None):
+    request = urllib.request.Request(url)
+    if etag:
+        request.add_header('If-None-Match', etag)
+    try:
+        response = urllib.request.urlopen(request)
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers.get('ETag'), None
+    return response.status, response.headers.get('ETag'), json.loads(response.read())
+
+
+class TestStatusServer(object):
+
+    def testGet(self):
+        cache = status_server.StatusCache()
+        server = status_server.StatusServer(cache, 0, host='127.0.0.1')
+        server.Start()
+        url = 'http://127.0.0.1:%s/status' % server.port
+        try:
+            assert Get(url + '/MockCampsite')[0] == 404
+            assert Get(url)[2] == {'campsites': {}}
+
+            polled_at = time.time() - 30
+            cache.Update(MockCampsite, {'CB1': [datetime.datetime(2021, 5, 14)]}, polled_at)
+            status_code, etag, status = Get(url + '/MockCampsite')
+            assert status_code == 200
+            assert status['campsite'] == 'Mock Campsite'
+            assert status['sites'] == {'CB1': ['2021-05-14']}
+            assert status['last_diff'] is None
+            assert 30 <= status['age_secs'] <= 31
+
+            # Polling again without a change keeps the etag but updates the age.
+            cache.Update(MockCampsite, {'CB1': [datetime.datetime(2021, 5, 14)]}, polled_at + 30)
+            assert Get(url + '/MockCampsite', etag)[0] == 304
+            assert Get(url + '/MockCampsite')[2]['age_secs'] <= 1
+
+            cache.Update(MockCampsite, {'CB1': [datetime.datetime(2021, 5, 15)]}, polled_at + 60)
+            status_code, new_etag, status = Get(url + '/MockCampsite', etag)
+            assert status_code == 200
+            assert new_etag != etag
+            assert status['last_diff'] == {'added': {'CB1': ['2021-05-15']}, 'removed': {'CB1': ['2021-05-14']}}
+            assert Get(url)[2]['campsites']['MockCampsite']['version'] == status['version']
+        finally:
+            server.Stop()
+
+
+if __name__ == '__main__':
+    TestStatusServer().testGet()
@@ -0,0 +1,168 @@
+"""One shot scan of many campsites that streams availability as JSON Lines.
+
+Unlike find_cabin_availability.py this doesn't loop forever, send emails or need any
+credentials. Campsites are scanned concurrently, requests to each reservation host are
+rate limited, and a json line is written to stdout for every (campsite, site, date). A
+timing summary is written to stderr on exit.
+
+Output is streamed per campsite, not per request window. Parsers return a campsite's whole
+date range at once, so a campsite's lines are written together once all of its windows have
+been fetched, while other campsites are still being scanned.
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import sys
+import threading
+import time
+
+# Local modules
+import campsites
+import logger as lgr
+import parser_registry
+
+
+USAGE = """
+    sweep.py [--start YYYY-MM-DD] [--end YYYY-MM-DD | --days N] [--workers N]
+             [--min-interval SECS] [--verbose] CAMPSITE_CLASS_NAME [CAMPSITE_CLASS_NAME ...]
+"""
+
+DEFAULT_DAYS = 90
+DEFAULT_WORKERS = 8
+DEFAULT_MIN_INTERVAL_SECS = 1.0  # Minimum time between starting two requests to the same host.
+
+
+class HostRateLimiter(object):
+    """Spaces out requests to each host by at least min_interval_secs, across threads."""
+
+    def __init__(self, min_interval_secs):
+        self.min_interval_secs = min_interval_secs
+        self.lock = threading.Lock()
+        self.next_request_time = {}  # Host -> earliest time the next request may start.
+
+    def _Reserve(self, host, now):
+        """Returns the time the next request to host may start and books the slot. Called with the lock held."""
+        request_time = max(now, self.next_request_time.get(host, 0))
+        self.next_request_time[host] = request_time + self.min_interval_secs
+        return request_time
+
+    def Wait(self, host):
+        with self.lock:
+            now = time.time()
+            request_time = self._Reserve(host, now)
+        if request_time > now:
+            time.sleep(request_time - now)
+
+
+def _ScanCampsite(campsite, start_date, end_date, throttle, logger):
+    """Returns a (sorted list of available (site, date) tuples, secs taken) tuple."""
+    scan_start_time = time.time()
+    parser = parser_registry.GetParser(campsite, logger, throttle)
+    site_to_available_dates = parser.ParseAvailability(campsite, start_date, end_date)
+    site_dates = set()
+    for site, dates in site_to_available_dates.items():
+        if not campsite.site_regex.match(site):
+            continue
+        for date in dates:
+            date = datetime.date.fromordinal(date.toordinal())
+            if start_date <= date < end_date:
+                site_dates.add((site, date))
+    return sorted(site_dates), time.time() - scan_start_time
+
+
+def Sweep(campsite_classes, start_date, end_date, out, workers=DEFAULT_WORKERS,
+          min_interval_secs=DEFAULT_MIN_INTERVAL_SECS, logger=None, throttle=None):
+    """Scans campsite_classes concurrently, writing a json line per available site and date to out.
+
+    Each campsite's lines are written as soon as its scan finishes. throttle defaults to a
+    HostRateLimiter spacing requests min_interval_secs apart.
+
+    Returns a list of per campsite summary dicts, in the order the scans finished.
+    """
+    if logger is None:
+        logger = lgr.Logger(False, max_lines=0, echo=False)
+    if throttle is None:
+        throttle = HostRateLimiter(min_interval_secs)
+    summaries = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for campsite in campsite_classes:
+            future = executor.submit(_ScanCampsite, campsite, start_date, end_date, throttle, logger)
+            futures[future] = campsite
+        for future in concurrent.futures.as_completed(futures):
+            campsite = futures[future]
+            summary = {'campsite': campsite.__name__}
+            try:
+                site_dates, secs = future.result()
+            except Exception as e:
+                summary['error'] = '%s: %s' % (type(e).__name__, e)
+                summaries.append(summary)
+                continue
+            summary['secs'] = round(secs, 3)
+            for site, date in site_dates:
+                out.write(json.dumps({
+                    'campsite': campsite.__name__,
+                    'name': campsite.name,
+                    'site': site,
+                    'date': date.isoformat(),
+                }) + '\n')
+            out.flush()
+            summary['sites'] = len(set(site for site, _ in site_dates))
+            summary['dates'] = len(site_dates)
+            summaries.append(summary)
+    return summaries
+
+
+def _ParseDate(value):
+    return datetime.datetime.strptime(value, r'%Y-%m-%d').date()
+
+
+def _GetCampsiteClass(name):
+    campsite_class = getattr(campsites, name, None)
+    if not isinstance(campsite_class, type) or not issubclass(campsite_class, campsites.Campsite):
+        raise argparse.ArgumentTypeError('%s is not a valid campsite class name' % name)
+    is_valid, err_msg = campsite_class.Validate()
+    if not is_valid:
+        raise argparse.ArgumentTypeError(err_msg)
+    if not parser_registry.HasBackend(campsite_class):
+        raise argparse.ArgumentTypeError('No parser backend registered for %s' % name)
+    return campsite_class
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(usage=USAGE, description=__doc__.split('\n')[0])
+    arg_parser.add_argument('campsites', nargs='+', type=_GetCampsiteClass, metavar='CAMPSITE_CLASS_NAME')
+    arg_parser.add_argument('--start', type=_ParseDate, help='First date to scan, default tomorrow.')
+    end_group = arg_parser.add_mutually_exclusive_group()
+    end_group.add_argument('--end', type=_ParseDate, help='Date to scan up to, exclusive.')
+    end_group.add_argument('--days', type=int, default=DEFAULT_DAYS, help='Days to scan, default %s.' % DEFAULT_DAYS)
+    arg_parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Campsites scanned at once.')
+    arg_parser.add_argument('--min-interval', type=float, default=DEFAULT_MIN_INTERVAL_SECS,
+                            help='Minimum secs between requests to the same host.')
+    arg_parser.add_argument('--verbose', action='store_true', help='Log parser progress to stderr.')
+    args = arg_parser.parse_args(argv)
+
+    start_date = args.start or datetime.date.today() + datetime.timedelta(days=1)
+    end_date = args.end or start_date + datetime.timedelta(days=args.days)
+    logger = lgr.Logger(False, max_lines=0, echo=args.verbose, stream=sys.stderr)
+
+    sweep_start_time = time.time()
+    summaries = Sweep(args.campsites, start_date, end_date, sys.stdout, args.workers, args.min_interval, logger)
+    elapsed_secs = time.time() - sweep_start_time
+
+    for summary in summaries:
+        if 'error' in summary:
+            sys.stderr.write('%-30s  FAILED %s\n' % (summary['campsite'], summary['error']))
+        else:
+            sys.stderr.write('%-30s %8.2fs  %s sites, %s dates\n' % (
+                summary['campsite'], summary['secs'], summary['sites'], summary['dates']))
+    num_failed = len([s for s in summaries if 'error' in s])
+    sys.stderr.write('Scanned %s campsites from %s to %s in %.2fs, %s lines, %s failed\n' % (
+        len(summaries), start_date.isoformat(), end_date.isoformat(), elapsed_secs,
+        sum(s.get('dates', 0) for s in summaries), num_failed))
+    return 1 if num_failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
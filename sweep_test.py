@@ -0,0 +1,91 @@
+import datetime
+import io
+import json
+import re
+import campsites
+import parser_base
+import parser_registry
+import sweep
+
+
+class MockCampsiteBase(campsites.Campsite):
+    pass
+
+
+class MockCampsiteA(MockCampsiteBase):
+    name = 'Mock Campsite A'
+    site_regex = re.compile(r'CB.*')
+
+
+class MockCampsiteB(MockCampsiteBase):
+    name = 'Mock Campsite B'
+    site_regex = re.compile(r'.*')
+
+
+class MockBrokenCampsite(MockCampsiteBase):
+    name = 'Mock Broken Campsite'
+    site_regex = re.compile(r'.*')
+
+
+class MockParser(parser_base.Parser):
+    """Makes two rate limited requests to the same host per campsite."""
+
+    campsite_class = MockCampsiteBase
+    host = 'mock.example.com'
+
+    def ParseAvailability(self, campsite, start_date, end_date):
+        self._WaitForHost()
+        self._WaitForHost()
+        if campsite is MockBrokenCampsite:
+            raise IOError('mock failure')
+        return {
+            'CB1': [datetime.datetime(2021, 5, 1), datetime.datetime(2021, 5, 2), datetime.datetime(2021, 9, 1)],
+            'CP1': [datetime.datetime(2021, 5, 3)],
+        }
+
+
+parser_registry.RegisterBackend(MockCampsiteBase, __name__, 'MockParser')
+
+
+class RecordingRateLimiter(sweep.HostRateLimiter):
+    """Records the start time the limiter gives each request."""
+
+    def __init__(self, min_interval_secs):
+        super(RecordingRateLimiter, self).__init__(min_interval_secs)
+        self.request_times = []  # (host, request time) in the order they were reserved.
+
+    def _Reserve(self, host, now):
+        request_time = super(RecordingRateLimiter, self)._Reserve(host, now)
+        self.request_times.append((host, request_time))
+        return request_time
+
+
+class TestSweep(object):
+
+    def testSweep(self):
+        out = io.StringIO()
+        throttle = RecordingRateLimiter(0.1)
+        summaries = sweep.Sweep(
+            [MockCampsiteA, MockCampsiteB, MockBrokenCampsite],
+            datetime.date(2021, 5, 1), datetime.date(2021, 6, 1), out, workers=3, throttle=throttle)
+
+        # 6 requests to one host spaced 0.1 secs apart, even though the campsites run concurrently.
+        assert [host for host, _ in throttle.request_times] == ['mock.example.com'] * 6
+        request_times = [request_time for _, request_time in throttle.request_times]
+        assert all(later - earlier >= 0.1 - 1e-6 for earlier, later in zip(request_times, request_times[1:]))
+        lines = sorted((line['campsite'], line['site'], line['date']) for line in map(json.loads, out.getvalue().splitlines()))
+        assert lines == [
+            ('MockCampsiteA', 'CB1', '2021-05-01'),
+            ('MockCampsiteA', 'CB1', '2021-05-02'),
+            ('MockCampsiteB', 'CB1', '2021-05-01'),
+            ('MockCampsiteB', 'CB1', '2021-05-02'),
+            ('MockCampsiteB', 'CP1', '2021-05-03'),
+        ]
+        summaries = dict((summary['campsite'], summary) for summary in summaries)
+        assert summaries['MockCampsiteB']['sites'] == 2
+        assert summaries['MockCampsiteB']['dates'] == 3
+        assert 'mock failure' in summaries['MockBrokenCampsite']['error']
+
+
+if __name__ == '__main__':
+    TestSweep().testSweep()